@@ -134,13 +134,12 @@ def inject_autonomous_events(history: list[dict[str, str]], events: list[dict[st
     if not events:
         return 0
 
-    history.append(
-        {
-            "role": "user",
-            "content": f"<autonomy-events>\n{_to_json(events)}\n</autonomy-events>",
-        }
+    history.extend(
+        (
+            {"role": "user", "content": f"<autonomy-events>\n{_to_json(events)}\n</autonomy-events>"},
+            {"role": "assistant", "content": "Noted autonomous team events."},
+        )
     )
-    history.append({"role": "assistant", "content": "Noted autonomous team events."})
     return len(events)
 
 
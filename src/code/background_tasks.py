@@ -2,23 +2,100 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+import queue
+import secrets
+import signal
 import subprocess
 import threading
 import time
-import uuid
-from dataclasses import dataclass, field
+from collections import Counter
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from typing import Any
 
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import uvloop
+except Exception:
+    uvloop = None
+
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+
+
+_DANGEROUS_TOKENS = ("rm -rf /", "shutdown", "reboot", "> /dev/")
+
+
+def _build_danger_automaton() -> Any:
+    """把危险片段编译为 Aho-Corasick 自动机；未安装 pyahocorasick 时返回 `None`。"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for token in _DANGEROUS_TOKENS:
+        automaton.add_word(token, token)
+    automaton.make_automaton()
+    return automaton
+
+
+_DANGER_AUTOMATON = _build_danger_automaton()
+
+
+_MIN_CONCURRENT_TASKS = 4
+
+
+def _default_concurrency() -> int:
+    """后台任务并发上限默认值：当前进程可用的 CPU 数。
+
+    后台命令常是等待 I/O 的长任务（如开发服务器），单核机器上也至少保留
+    `_MIN_CONCURRENT_TASKS` 个并发位，避免一个长任务阻塞其余所有任务。
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    return max(_MIN_CONCURRENT_TASKS, cpus)
+
+
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    """创建后台任务事件循环；安装了 uvloop 时优先使用。"""
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
 def _json(data: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
     return json.dumps(data, ensure_ascii=False, indent=2)
 
 
+async def _kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    """杀掉 shell 及其派生的整个进程组，避免孙进程继续占用输出管道。"""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await proc.wait()
+
+
 @dataclass
 class BackgroundTaskRecord:
-    """后台任务状态记录。"""
+    """后台任务状态记录。
+
+    记录创建后不再原地修改：字典视图 `_cached_dict` 在构造时一并生成，
+    任务状态变化时由 `_execute` 用 `replace` 整体替换为新记录（视图随之重建），
+    因此读取方无需加锁即可拿到字段一致的快照。
+    """
 
     task_id: str
     command: str
@@ -28,26 +105,48 @@ class BackgroundTaskRecord:
     return_code: int | None = None
     finished_at: float | None = None
     output_preview: str = ""
+    _cached_dict: dict[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._cached_dict = {
+            "task_id": self.task_id,
+            "command": self.command,
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timeout_seconds": self.timeout_seconds,
+            "return_code": self.return_code,
+            "output_preview": self.output_preview,
+        }
 
 
 @dataclass
 class BackgroundManager:
-    """后台任务管理器。"""
+    """后台任务管理器。
+
+    并发约定：`_lock` 只保护写操作（`run` 插入记录、`_execute` 替换记录并更新计数）；
+    `check` 与 `drain_notifications` 不加锁，依赖记录不可变与 GIL 下 dict 单次读取的原子性。
+    """
 
     workdir: Path
     default_timeout: int = 300
     max_output_chars: int = 50000
     preview_chars: int = 500
+    max_concurrent: int = field(default_factory=_default_concurrency)
     _tasks: dict[str, BackgroundTaskRecord] = field(default_factory=dict)
-    _notification_queue: list[dict[str, str]] = field(default_factory=list)
+    _notification_queue: queue.SimpleQueue[dict[str, str]] = field(default_factory=queue.SimpleQueue)
     _lock: threading.Lock = field(default_factory=threading.Lock)
+    _loop: asyncio.AbstractEventLoop | None = field(default=None, init=False, repr=False)
+    _slots: asyncio.Semaphore | None = field(default=None, init=False, repr=False)
+    _status_counts: Counter[str] = field(default_factory=Counter, init=False, repr=False)
 
     def _is_dangerous(self, command: str) -> bool:
-        dangerous = ["rm -rf /", "shutdown", "reboot", "> /dev/"]
-        return any(token in command for token in dangerous)
+        if _DANGER_AUTOMATON is not None:
+            return next(_DANGER_AUTOMATON.iter(command), None) is not None
+        return any(token in command for token in _DANGEROUS_TOKENS)
 
     def run(self, command: str, timeout_seconds: int | None = None) -> str:
-        """启动后台任务线程并立即返回。"""
+        """把任务提交到后台事件循环并立即返回。"""
         cmd = (command or "").strip()
         if not cmd:
             return "Error: command is required"
@@ -55,7 +154,7 @@ class BackgroundManager:
             return "Error: Dangerous command blocked"
 
         timeout = int(timeout_seconds or self.default_timeout)
-        task_id = str(uuid.uuid4())[:8]
+        task_id = secrets.token_hex(4)
         record = BackgroundTaskRecord(
             task_id=task_id,
             command=cmd,
@@ -66,9 +165,9 @@ class BackgroundManager:
 
         with self._lock:
             self._tasks[task_id] = record
+            self._status_counts["running"] += 1
 
-        thread = threading.Thread(target=self._execute, args=(task_id,), daemon=True)
-        thread.start()
+        asyncio.run_coroutine_threadsafe(self._execute(task_id), self._ensure_loop())
         return _json(
             {
                 "message": f"Background task {task_id} started",
@@ -79,30 +178,22 @@ class BackgroundManager:
             }
         )
 
-    def _execute(self, task_id: str) -> None:
-        with self._lock:
-            record = self._tasks.get(task_id)
-            if record is None:
-                return
-            command = record.command
-            timeout = record.timeout_seconds
+    async def _execute(self, task_id: str) -> None:
+        record = self._tasks.get(task_id)
+        if record is None:
+            return
+        command = record.command
+        timeout = record.timeout_seconds
 
         status = "completed"
         return_code: int | None = None
         output = ""
 
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                cwd=self.workdir,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-            )
-            return_code = result.returncode
-            output = (result.stdout + result.stderr).strip()
-            if result.returncode != 0:
+            async with self._slots:
+                return_code, output = await self._run_bounded(command, timeout)
+            output = output.strip()
+            if return_code != 0:
                 status = "failed"
         except subprocess.TimeoutExpired:
             status = "timeout"
@@ -118,61 +209,113 @@ class BackgroundManager:
             record = self._tasks.get(task_id)
             if record is None:
                 return
-            record.status = status
-            record.return_code = return_code
-            record.finished_at = time.time()
-            record.output_preview = preview
-            self._notification_queue.append(
-                {
-                    "task_id": task_id,
-                    "status": status,
-                    "command": record.command,
-                    "result": preview,
-                }
+            self._status_counts[record.status] -= 1
+            self._status_counts[status] += 1
+            self._tasks[task_id] = replace(
+                record,
+                status=status,
+                return_code=return_code,
+                finished_at=time.time(),
+                output_preview=preview,
             )
+        self._notification_queue.put(
+            {
+                "task_id": task_id,
+                "status": status,
+                "command": command,
+                "result": preview,
+            }
+        )
 
-    def check(self, task_id: str | None = None) -> str:
-        """查询后台任务状态。"""
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """惰性启动专用事件循环线程；所有后台任务共享这一个线程。
+
+        同时运行的命令数受 `max_concurrent` 限制，超出的任务在循环内排队等待空位。
+        """
         with self._lock:
-            if task_id:
-                record = self._tasks.get(task_id)
-                if record is None:
-                    return f"Error: task {task_id} not found"
-                payload = self._record_to_dict(record)
-                return _json(payload)
-
-            tasks = [self._record_to_dict(record) for record in self._tasks.values()]
-            tasks.sort(key=lambda item: item["started_at"])
-            summary = {
-                "count": len(tasks),
-                "running": sum(1 for item in tasks if item["status"] == "running"),
-                "completed": sum(1 for item in tasks if item["status"] == "completed"),
-                "failed": sum(1 for item in tasks if item["status"] == "failed"),
-                "timeout": sum(1 for item in tasks if item["status"] == "timeout"),
-                "tasks": tasks,
-            }
-            return _json(summary)
+            if self._loop is None:
+                self._slots = asyncio.Semaphore(max(1, self.max_concurrent))
+                loop = _new_event_loop()
+                threading.Thread(target=loop.run_forever, name="background-tasks", daemon=True).start()
+                self._loop = loop
+            return self._loop
 
-    def _record_to_dict(self, record: BackgroundTaskRecord) -> dict[str, Any]:
-        return {
-            "task_id": record.task_id,
-            "command": record.command,
-            "status": record.status,
-            "started_at": record.started_at,
-            "finished_at": record.finished_at,
-            "timeout_seconds": record.timeout_seconds,
-            "return_code": record.return_code,
-            "output_preview": record.output_preview,
+    async def _run_bounded(self, command: str, timeout: int) -> tuple[int, str]:
+        """执行命令并只保留前 `max_output_chars` 个字符的输出（stderr 合并到 stdout）。
+
+        管道持续读空以免子进程阻塞，但超出上限的字节直接丢弃，内存占用与输出总量无关。
+
+        Raises:
+            subprocess.TimeoutExpired: 超过 `timeout` 秒仍未结束时（子进程已被 kill）。
+        """
+        # UTF-8 单字符最多 4 字节，按字节上限截断后解码不会少于 max_output_chars 个字符。
+        byte_limit = self.max_output_chars * 4
+        buffer = bytearray()
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            cwd=self.workdir,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+        async def collect() -> int:
+            while data := await proc.stdout.read(65536):
+                room = byte_limit - len(buffer)
+                if room > 0:
+                    buffer.extend(memoryview(data)[:room])
+            return await proc.wait()
+
+        try:
+            return_code = await asyncio.wait_for(collect(), timeout)
+        except asyncio.TimeoutError:
+            await _kill_process_group(proc)
+            raise subprocess.TimeoutExpired(command, timeout) from None
+        except BaseException:
+            if proc.returncode is None:
+                await _kill_process_group(proc)
+            raise
+        return return_code, buffer.decode("utf-8", errors="replace")
+
+    def check(self, task_id: str | None = None) -> str:
+        """查询后台任务状态。
+
+        只读路径不加锁：单次 dict 读取与 `list(dict.values())` 快照在 GIL 下是原子的，
+        而记录本身只会被整体替换，不会被原地修改。
+        """
+        if task_id:
+            record = self._tasks.get(task_id)
+            if record is None:
+                return f"Error: task {task_id} not found"
+            payload = self._record_to_dict(record)
+            return _json(payload)
+
+        # 状态计数随状态变化增量维护；任务按插入（即启动）顺序排列，无需再排序。
+        status_counts = self._status_counts.copy()
+        tasks = [self._record_to_dict(record) for record in list(self._tasks.values())]
+        summary = {
+            "count": len(tasks),
+            "running": status_counts["running"],
+            "completed": status_counts["completed"],
+            "failed": status_counts["failed"],
+            "timeout": status_counts["timeout"],
+            "tasks": tasks,
         }
+        return _json(summary)
+
+    def _record_to_dict(self, record: BackgroundTaskRecord) -> dict[str, Any]:
+        """返回记录构造时生成的字典视图；状态变化会换成新记录，视图不会过期。"""
+        return record._cached_dict
 
     def drain_notifications(self) -> list[dict[str, str]]:
         """排空通知队列，用于注入到下一轮对话。"""
-        with self._lock:
-            if not self._notification_queue:
-                return []
-            drained = list(self._notification_queue)
-            self._notification_queue.clear()
-            return drained
+        drained: list[dict[str, str]] = []
+        while True:
+            try:
+                drained.append(self._notification_queue.get_nowait())
+            except queue.Empty:
+                return drained
 
 
 def build_background_tools(manager: BackgroundManager) -> list:
@@ -5,9 +5,20 @@ from __future__ import annotations
 import json
 import os
 import time
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+
+# 单线程写盘：转录按提交顺序落盘，REPL 不必等待 I/O；解释器退出前会等待队列写完。
+_TRANSCRIPT_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcript-writer")
 
 
 def _extract_text(content: Any) -> str:
@@ -75,6 +86,43 @@ def _set_message_content(message: Any, new_content: str) -> None:
     setattr(message, "content", new_content)
 
 
+def _jsonl_blob(records: list[dict[str, Any]]) -> bytes:
+    """把记录序列化为一整段 JSONL 字节串；优先使用 orjson。"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        return b"".join(orjson.dumps(record, default=str, option=option) + b"\n" for record in records)
+    return "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records).encode("utf-8")
+
+
+def _dumps_record(record: dict[str, Any]) -> str:
+    """序列化单条记录为紧凑 JSON 文本；优先使用 orjson，标准库路径使用相同的紧凑分隔符。"""
+    if orjson is not None:
+        return orjson.dumps(record, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(record, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+def _serialize_until(records: Iterable[dict[str, Any]], budget: int) -> str:
+    """把记录序列化为紧凑 JSON 数组文本，累计长度达到 `budget` 字符后停止。
+
+    标准库路径的结果等于 `json.dumps(records, ensure_ascii=False, default=str, separators=(",", ":"))[:budget]`，
+    但超出预算的记录不会被序列化。orjson 输出同样的紧凑格式；常见的字符串、数字与嵌套结构两者一致，
+    `default=str` 兜底的对象（如 datetime）格式可能略有不同。
+    """
+    chunks = ["["]
+    length = 1
+    for index, record in enumerate(records):
+        if length >= budget:
+            break
+        text = _dumps_record(record)
+        if index:
+            text = "," + text
+        chunks.append(text)
+        length += len(text)
+    else:
+        chunks.append("]")
+    return "".join(chunks)[:budget]
+
+
 def _as_serializable(message: Any) -> dict[str, Any]:
     """把任意消息对象转为可写盘结构。"""
     if isinstance(message, dict):
@@ -99,63 +147,150 @@ class ContextCompactor:
     keep_recent_tool_results: int = 3
     transcript_dirname: str = ".transcripts"
     max_summary_source_chars: int = 80000
+    history_window: int = 0
+    _size_cache: dict[int, tuple[Any, Any, int]] = field(default_factory=dict, init=False, repr=False)
+    _serialize_cache: dict[int, tuple[Any, dict[str, Any]]] = field(default_factory=dict, init=False, repr=False)
+    _compacted_upto: int = field(default=0, init=False, repr=False)
+    _compacted_tail: Any = field(default=None, init=False, repr=False)
 
     @property
     def transcript_dir(self) -> Path:
         return self.workdir / self.transcript_dirname
 
-    def estimate_tokens(self, messages: list[Any]) -> int:
-        """粗略估算 token 数量（约 4 chars/token）。"""
-        return len(str(messages)) // 4
+    def _message_chars(self, message: Any) -> int:
+        """返回单条消息 `repr` 的长度，按对象身份缓存。
+
+        LangGraph 会在首次测量后原地补上消息的 `id`，`id` 变化时重新测量。
+        """
+        message_id = message.get("id") if isinstance(message, dict) else getattr(message, "id", None)
+        cached = self._size_cache.get(id(message))
+        if cached is not None and cached[0] is message and cached[1] == message_id:
+            return cached[2]
+        size = len(repr(message))
+        self._size_cache[id(message)] = (message, message_id, size)
+        return size
+
+    def _serialize(self, message: Any) -> dict[str, Any]:
+        """`_as_serializable` 的缓存版本：同一消息对象只做一次 `model_dump()`。"""
+        if isinstance(message, dict):
+            return message
+        cached = self._serialize_cache.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        dumped = _as_serializable(message)
+        self._serialize_cache[id(message)] = (message, dumped)
+        return dumped
+
+    def _mark_compacted(self, messages: list[Any]) -> None:
+        """记录本次 micro_compact 已处理到的位置与边界消息。"""
+        self._compacted_upto = len(messages)
+        self._compacted_tail = messages[-1] if messages else None
+
+    def _forget_message(self, message: Any) -> None:
+        """消息内容被原地修改后，丢弃其缓存长度与序列化结果。"""
+        self._size_cache.pop(id(message), None)
+        self._serialize_cache.pop(id(message), None)
 
-    def micro_compact(self, messages: list[Any]) -> None:
-        """层1：仅保留最近 N 条工具输出明文，其余替换为占位。"""
-        tool_message_indexes: list[int] = []
-        nested_tool_results: list[tuple[Any, int]] = []
-
-        for index, message in enumerate(messages):
-            role = _message_role(message).lower()
-            content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+    def estimate_tokens(self, messages: list[Any]) -> int:
+        """粗略估算 token 数量（约 4 chars/token）。
 
+        近似于 `len(str(messages)) // 4`，但不再每轮拼接整段历史：每条消息的长度按对象身份缓存，
+        之后只为新增消息付出开销。消息被原地修改且未经 `_forget_message` 时结果可能略有偏差，
+        作为压缩阈值的估算已经足够。
+        """
+        if not messages:
+            return 0
+        # str(list) = "[" + ", ".join(repr(item)) + "]"
+        chars = 2 * len(messages) + sum(self._message_chars(message) for message in messages)
+        if len(self._size_cache) > 2 * len(messages) + 64:
+            live = {id(message) for message in messages}
+            self._size_cache = {key: value for key, value in self._size_cache.items() if key in live}
+        return chars // 4
+
+    @staticmethod
+    def _collect_tool_outputs(
+        messages: Iterable[Any],
+        tool_messages: list[tuple[Any, Any]],
+        nested_tool_results: list[tuple[Any, dict[str, Any]]],
+    ) -> None:
+        """单次遍历收集工具输出：角色与内容就地取出并随消息一起记录。"""
+        dict_t, list_t, str_t = dict, list, str
+        for message in messages:
+            if isinstance(message, dict_t):
+                role = message.get("role")
+                content = message.get("content")
+            else:
+                role = getattr(message, "type", None)
+                if not isinstance(role, str_t):
+                    role = getattr(message, "role", None)
+                content = getattr(message, "content", None)
+            if not isinstance(role, str_t):
+                continue
+
+            role = role.lower()
             if role == "tool":
-                tool_message_indexes.append(index)
-
-            if role == "user" and isinstance(content, list):
-                for part_index, part in enumerate(content):
-                    if isinstance(part, dict) and part.get("type") == "tool_result":
-                        nested_tool_results.append((message, part_index))
-
-        if len(tool_message_indexes) > self.keep_recent_tool_results:
-            for idx in tool_message_indexes[:-self.keep_recent_tool_results]:
-                message = messages[idx]
-                raw_content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
-                content_text = _extract_text(raw_content)
-                if len(content_text) <= 100:
+                tool_messages.append((message, content))
+            elif role == "user" and isinstance(content, list_t):
+                for part in content:
+                    if isinstance(part, dict_t) and part.get("type") == "tool_result":
+                        nested_tool_results.append((message, part))
+
+    def micro_compact(self, messages: list[Any]) -> None:
+        """层1：仅保留最近 N 条工具输出明文，其余替换为占位。
+
+        上次处理过的前缀若原样保留（以边界消息的对象身份判断），且新增消息中没有工具输出，
+        则不会有新的输出落出“最近 N 条”窗口，直接返回，避免每轮全量扫描。
+        """
+        keep = self.keep_recent_tool_results
+        tool_messages: list[tuple[Any, Any]] = []
+        nested_tool_results: list[tuple[Any, dict[str, Any]]] = []
+
+        upto = self._compacted_upto
+        if 0 < upto <= len(messages) and messages[upto - 1] is self._compacted_tail:
+            self._collect_tool_outputs(islice(messages, upto, None), tool_messages, nested_tool_results)
+            if not tool_messages and not nested_tool_results:
+                self._mark_compacted(messages)
+                return
+            tool_messages.clear()
+            nested_tool_results.clear()
+
+        self._collect_tool_outputs(messages, tool_messages, nested_tool_results)
+        self._mark_compacted(messages)
+
+        if keep > 0 and len(tool_messages) > keep:
+            for message, content in islice(tool_messages, len(tool_messages) - keep):
+                if len(_extract_text(content)) <= 100:
                     continue
                 tool_name = _message_tool_name(message)
                 _set_message_content(message, f"[Previous: used {tool_name}]")
+                self._forget_message(message)
 
-        if len(nested_tool_results) > self.keep_recent_tool_results:
-            for msg, part_index in nested_tool_results[:-self.keep_recent_tool_results]:
-                part = msg["content"][part_index]
+        if keep > 0 and len(nested_tool_results) > keep:
+            for message, part in islice(nested_tool_results, len(nested_tool_results) - keep):
                 content_text = part.get("content")
                 if not isinstance(content_text, str) or len(content_text) <= 100:
                     continue
                 part["content"] = "[Previous: used tool]"
+                self._forget_message(message)
+
+    def _save_transcript(self, messages: list[Any]) -> tuple[Path, Future[int]]:
+        """保存完整会话到 jsonl。
 
-    def _save_transcript(self, messages: list[Any]) -> Path:
-        """保存完整会话到 jsonl。"""
+        序列化在当前线程一次完成（之后历史可能被替换或修改），
+        写盘交给后台单线程执行，与随后的摘要 LLM 调用重叠。调用方在引用路径前
+        需等待返回的 `Future`，写入失败（磁盘满、无权限等）会在那里抛出。
+        """
         self.transcript_dir.mkdir(parents=True, exist_ok=True)
         path = self.transcript_dir / f"transcript_{int(time.time())}.jsonl"
-        with path.open("w", encoding="utf-8") as f:
-            for message in messages:
-                f.write(json.dumps(_as_serializable(message), ensure_ascii=False, default=str) + "\n")
-        return path
+        blob = _jsonl_blob([self._serialize(message) for message in messages])
+        return path, _TRANSCRIPT_WRITER.submit(path.write_bytes, blob)
 
     def _summarize_messages(self, messages: list[Any], focus: str | None = None) -> str:
         """调用 LangChain LLM 生成连续性摘要。"""
-        raw_text = json.dumps([_as_serializable(msg) for msg in messages], ensure_ascii=False, default=str)
-        source = raw_text[: self.max_summary_source_chars]
+        source = _serialize_until(
+            (self._serialize(msg) for msg in messages),
+            self.max_summary_source_chars,
+        )
 
         focus_text = focus.strip() if isinstance(focus, str) and focus.strip() else ""
         prompt = (
@@ -175,8 +310,12 @@ class ContextCompactor:
 
     def auto_compact(self, messages: list[Any], focus: str | None = None) -> list[dict[str, str]]:
         """层2：保存转录并摘要替换整个历史。"""
-        transcript_path = self._save_transcript(messages)
+        transcript_path, written = self._save_transcript(messages)
         summary = self._summarize_messages(messages, focus=focus)
+        written.result()
+        # 旧历史整体被摘要替换，缓存条目不会再被命中。
+        self._size_cache.clear()
+        self._serialize_cache.clear()
         return [
             {
                 "role": "user",
@@ -197,6 +336,47 @@ class ContextCompactor:
         compacted = self.auto_compact(messages, focus=focus)
         return compacted, True
 
+    @staticmethod
+    def _is_turn_start(message: Any) -> bool:
+        """判断消息能否作为保留窗口的起点：必须是用户消息，且不是携带 tool_result 的回传消息。"""
+        if _message_role(message).lower() not in ("user", "human"):
+            return False
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+        if isinstance(content, list):
+            return not any(isinstance(part, dict) and part.get("type") == "tool_result" for part in content)
+        return True
+
+    def maybe_window_compact(self, messages: list[Any]) -> tuple[list[Any], bool]:
+        """滑动窗口：历史超过 `2 * history_window` 条时，只保留最近至少 `history_window` 条原文。
+
+        更早的部分保存转录后由 LLM 摘要为一对消息放在最前面；上一次的摘要也在被摘要的前缀里，
+        因此摘要会随窗口滚动持续更新。窗口起点会向前对齐到最近的一条用户消息，
+        避免把 AI 的 tool_calls 与对应的工具结果拆开。`history_window <= 0` 时不启用。
+        """
+        window = self.history_window
+        if window <= 0 or len(messages) <= 2 * window:
+            return messages, False
+        cut = next(
+            (index for index in range(len(messages) - window, 0, -1) if self._is_turn_start(messages[index])),
+            None,
+        )
+        if not cut:
+            return messages, False
+        older = messages[:cut]
+        transcript_path, written = self._save_transcript(older)
+        summary = self._summarize_messages(older)
+        written.result()
+        for message in older:
+            self._forget_message(message)
+        return [
+            {
+                "role": "user",
+                "content": f"[Earlier context summarized. Transcript: {transcript_path}]\n\n{summary}",
+            },
+            {"role": "assistant", "content": "Understood. Continuing with the earlier context in mind."},
+            *messages[cut:],
+        ], True
+
     def manual_compact(self, messages: list[Any], focus: str | None = None) -> list[Any]:
         """层3：外部显式触发压缩。"""
         if not messages:
@@ -210,6 +390,7 @@ def build_context_compactor(llm: Any, workdir: Path) -> ContextCompactor:
     keep_recent = int(os.getenv("CONTEXT_COMPACT_KEEP_RECENT", "3"))
     source_chars = int(os.getenv("CONTEXT_COMPACT_SOURCE_CHARS", "80000"))
     transcript_dirname = os.getenv("CONTEXT_COMPACT_DIR", ".transcripts")
+    history_window = int(os.getenv("HISTORY_WINDOW", "0"))
     return ContextCompactor(
         llm=llm,
         workdir=workdir,
@@ -217,5 +398,6 @@ def build_context_compactor(llm: Any, workdir: Path) -> ContextCompactor:
         keep_recent_tool_results=keep_recent,
         transcript_dirname=transcript_dirname,
         max_summary_source_chars=source_chars,
+        history_window=history_window,
     )
 
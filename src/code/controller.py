@@ -1,8 +1,12 @@
 """Controller 层：负责交互命令解析与输入路由拼装。"""
 
-from typing import Callable
+import functools
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable
 
 
+@functools.lru_cache(maxsize=16)
 def render_active_selection(selected_skill: str | None, selected_subagent: str | None) -> str:
     """渲染当前激活的 skill/subagent 状态。
 
@@ -11,7 +15,7 @@ def render_active_selection(selected_skill: str | None, selected_subagent: str |
         selected_subagent: 当前选中的 subagent 名称；为空表示自动选择。
 
     Returns:
-        用于终端展示的一行状态文本。
+        用于终端展示的一行状态文本。输入组合很少变化，结果按参数缓存。
     """
     skill_text = selected_skill or "(auto)"
     subagent_text = selected_subagent or "(auto)"
@@ -53,6 +57,224 @@ def build_routed_input(user_text: str, selected_skill: str | None, selected_suba
     )
 
 
+def build_batched_input(tasks: list[str]) -> str:
+    """把排队的多个任务打包为一次调用的输入文本。
+
+    多个任务共用同一份系统提示前缀与会话历史，只付一次前缀开销；
+    要求按编号返回 JSON 列表，便于把结果对应回各个任务。
+
+    Args:
+        tasks: 按排队顺序排列的任务文本。
+
+    Returns:
+        列出全部任务并约定输出格式的输入文本。
+    """
+    items = "\n".join(f"{index}. {task}" for index, task in enumerate(tasks, start=1))
+    return (
+        "Process each of the following items independently:\n"
+        + items
+        + "\n\nReturn a JSON list with one entry per item, in order: "
+        + '[{"id": <item number>, "result": <result>}]'
+    )
+
+
+@dataclass
+class BatchQueue:
+    """`/batch` 的任务队列，由主循环持有并跨轮保留。
+
+    Attributes:
+        pending: 已排队、尚未发送的任务。
+        dispatched: 最近一次 `/batch run` 发送的任务；主循环据此把回复对应回各任务，展示后清空。
+    """
+
+    pending: list[str] = field(default_factory=list)
+    dispatched: list[str] = field(default_factory=list)
+
+
+def _reply_text(content: Any) -> str:
+    """取出回复消息中的文本（字符串或分段列表中的 text 段）。"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text"
+        )
+    return ""
+
+
+def parse_batched_results(tasks: list[str], content: Any) -> list[tuple[str, Any]] | None:
+    """把批量调用的 JSON 列表回复按编号对应回各个任务。
+
+    回复中第一个 `[` 到最后一个 `]` 之间的内容按 JSON 解析（兼容 ```json 代码块包裹）；
+    要求每个任务编号恰好出现一次。
+
+    Args:
+        tasks: `/batch run` 发送的任务，顺序即编号。
+        content: agent 最后一条消息的内容。
+
+    Returns:
+        按任务顺序排列的 `(task, result)` 列表；回复不是合法列表、条目格式不对
+        或编号与任务数量对不上时返回 `None`。
+    """
+    text = _reply_text(content)
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        return None
+    try:
+        entries = json.loads(text[start : end + 1])
+    except ValueError:
+        return None
+    if not isinstance(entries, list) or len(entries) != len(tasks):
+        return None
+    results: dict[int, Any] = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or "result" not in entry:
+            return None
+        try:
+            index = int(entry.get("id"))
+        except (TypeError, ValueError):
+            return None
+        if not 1 <= index <= len(tasks) or index in results:
+            return None
+        results[index] = entry["result"]
+    return [(task, results[index]) for index, task in enumerate(tasks, start=1)]
+
+
+def render_batch_results(tasks: list[str], content: Any) -> str:
+    """渲染批量调用结果：逐条 `task -> result`，无法解析时给出回退提示。
+
+    Args:
+        tasks: `/batch run` 发送的任务。
+        content: agent 最后一条消息的内容。
+
+    Returns:
+        用于终端展示的多行文本。
+    """
+    pairs = parse_batched_results(tasks, content)
+    if pairs is None:
+        return f"[batch] reply is not a JSON list matching the {len(tasks)} task(s); see the full reply above."
+    lines = ["[batch] results:"]
+    for index, (task, result) in enumerate(pairs, start=1):
+        shown = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        lines.append(f"  {index}. {task} -> {shown}")
+    return "\n".join(lines)
+
+
+SelectionResult = tuple[str | None, str | None, str | None, bool]
+
+
+@dataclass(frozen=True)
+class _CommandDeps:
+    """命令路由依赖：由 `parse_selection_command` 的关键字参数组装，传给各路由函数。"""
+
+    handle_skill_command: Callable
+    handle_subagent_command: Callable
+    skills: dict[str, str]
+    skill_aliases: dict[str, str]
+    subagent_by_name: dict
+    batch_queue: BatchQueue | None
+
+
+def _route_skill(
+    parts: list[str],
+    selected_skill: str | None,
+    selected_subagent: str | None,
+    deps: _CommandDeps,
+) -> SelectionResult:
+    """`/skill` 命令路由：委托给 skill 命令处理函数。"""
+    selected_skill, task_text, handled = deps.handle_skill_command(
+        parts,
+        selected_skill,
+        selected_subagent,
+        deps.skills,
+        deps.skill_aliases,
+        render_active_selection,
+    )
+    return selected_skill, selected_subagent, task_text, handled
+
+
+def _route_subagent(
+    parts: list[str],
+    selected_skill: str | None,
+    selected_subagent: str | None,
+    deps: _CommandDeps,
+) -> SelectionResult:
+    """`/subagent` 命令路由：委托给 subagent 命令处理函数。"""
+    selected_subagent, task_text, handled = deps.handle_subagent_command(
+        parts,
+        selected_skill,
+        selected_subagent,
+        deps.subagent_by_name,
+        render_active_selection,
+    )
+    return selected_skill, selected_subagent, task_text, handled
+
+
+def _route_status(
+    parts: list[str],
+    selected_skill: str | None,
+    selected_subagent: str | None,
+    deps: _CommandDeps,
+) -> SelectionResult:
+    """`/status` 命令路由：打印当前选择状态。"""
+    print("\n" + render_active_selection(selected_skill, selected_subagent))
+    return selected_skill, selected_subagent, None, True
+
+
+def _route_batch(
+    parts: list[str],
+    selected_skill: str | None,
+    selected_subagent: str | None,
+    deps: _CommandDeps,
+) -> SelectionResult:
+    """`/batch` 命令路由：排队任务，`/batch run` 时打包成一次 agent 调用。
+
+    支持 `/batch <task>`（入队）、`/batch`/`/batch list`（查看）、`/batch clear`（清空）、
+    `/batch run`（打包发送；按当前 skill/subagent 选择路由）。
+    """
+    batch = deps.batch_queue
+    if batch is None:
+        print("Batching is not enabled in this session.")
+        return selected_skill, selected_subagent, None, True
+    queue = batch.pending
+
+    action = parts[1].lower() if len(parts) == 2 else None
+    if len(parts) == 1 or action in ("list", "ls"):
+        print("\nBatch queue:")
+        if not queue:
+            print("(empty)")
+        for index, task in enumerate(queue, start=1):
+            print(f"  {index}. {task}")
+        return selected_skill, selected_subagent, None, True
+
+    if action == "clear":
+        queue.clear()
+        print("Batch queue cleared.")
+        return selected_skill, selected_subagent, None, True
+
+    if action == "run":
+        if not queue:
+            print("Batch queue is empty. Use /batch <task> to add tasks.")
+            return selected_skill, selected_subagent, None, True
+        print(f"[batch] dispatching {len(queue)} queued task(s) in one call.")
+        task_text = build_batched_input(queue)
+        batch.dispatched = list(queue)
+        queue.clear()
+        return selected_skill, selected_subagent, task_text, False
+
+    queue.append(" ".join(parts[1:]))
+    print(f"[batch] queued task #{len(queue)}. Use /batch run to dispatch.")
+    return selected_skill, selected_subagent, None, True
+
+
+_COMMAND_HANDLERS: dict[str, Callable[[list[str], str | None, str | None, _CommandDeps], SelectionResult]] = {
+    "/skill": _route_skill,
+    "/subagent": _route_subagent,
+    "/status": _route_status,
+    "/batch": _route_batch,
+}
+
+
 def parse_selection_command(
     user_input: str,
     selected_skill: str | None,
@@ -63,8 +285,9 @@ def parse_selection_command(
     skills: dict[str, str],
     skill_aliases: dict[str, str],
     subagent_by_name: dict,
-) -> tuple[str | None, str | None, str | None, bool]:
-    """解析 `/skill`、`/subagent`、`/status` 命令并更新选择状态。
+    batch_queue: BatchQueue | None = None,
+) -> SelectionResult:
+    """解析 `/skill`、`/subagent`、`/status`、`/batch` 命令并更新选择状态。
 
     Args:
         user_input: 用户当前输入。
@@ -75,6 +298,7 @@ def parse_selection_command(
         skills: 可用 skill 字典。
         skill_aliases: skill 别名映射。
         subagent_by_name: subagent 名称到配置的映射。
+        batch_queue: `/batch` 使用的任务队列（由调用方持有，跨轮保留）；为 `None` 时禁用批处理。
 
     Returns:
         四元组 `(selected_skill, selected_subagent, task_text, handled)`：
@@ -84,36 +308,21 @@ def parse_selection_command(
         - `handled`: 是否已被命令处理（`True` 表示主循环不应继续普通调用）。
     """
     stripped = user_input.strip()
-    if not stripped.startswith("/"):
+    if stripped[:1] != "/":
         return selected_skill, selected_subagent, stripped, False
 
     parts = stripped.split(maxsplit=2)
-    command = parts[0].lower()
-
-    if command == "/skill":
-        selected_skill, task_text, handled = handle_skill_command(
-            parts,
-            selected_skill,
-            selected_subagent,
-            skills,
-            skill_aliases,
-            render_active_selection,
-        )
-        return selected_skill, selected_subagent, task_text, handled
-
-    if command == "/subagent":
-        selected_subagent, task_text, handled = handle_subagent_command(
-            parts,
-            selected_skill,
-            selected_subagent,
-            subagent_by_name,
-            render_active_selection,
-        )
-        return selected_skill, selected_subagent, task_text, handled
-
-    if command == "/status":
-        print("\n" + render_active_selection(selected_skill, selected_subagent))
+    handler = _COMMAND_HANDLERS.get(parts[0].lower())
+    if handler is None:
+        print("Unknown command. Use /skill, /subagent, /status, or /batch.")
         return selected_skill, selected_subagent, None, True
 
-    print("Unknown command. Use /skill, /subagent, or /status.")
-    return selected_skill, selected_subagent, None, True
+    deps = _CommandDeps(
+        handle_skill_command=handle_skill_command,
+        handle_subagent_command=handle_subagent_command,
+        skills=skills,
+        skill_aliases=skill_aliases,
+        subagent_by_name=subagent_by_name,
+        batch_queue=batch_queue,
+    )
+    return handler(parts, selected_skill, selected_subagent, deps)
@@ -0,0 +1,212 @@
+"""LLM 响应缓存：对相同的会话历史直接复用上一次的 agent 输出。"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import shelve
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+
+def _message_key_fields(message: Any) -> dict[str, Any]:
+    """抽取参与缓存键计算的消息字段。"""
+    if isinstance(message, dict):
+        role = message.get("role") or message.get("type") or ""
+        content = message.get("content")
+        tool_calls = message.get("tool_calls")
+    else:
+        role = getattr(message, "type", None) or getattr(message, "role", None) or ""
+        content = getattr(message, "content", None)
+        tool_calls = getattr(message, "tool_calls", None)
+    return {"role": role, "content": content, "tool_calls": tool_calls or None}
+
+
+def history_cache_key(history: list[Any], scope: str = "") -> str:
+    """根据会话历史计算稳定的缓存键。
+
+    Args:
+        history: 发送给 agent 的消息列表（dict 或 LangChain 消息对象）。
+        scope: 缓存作用域摘要；不同作用域下相同的历史得到不同的键。
+
+    Returns:
+        sha256 十六进制摘要。
+    """
+    payload = json.dumps(
+        [scope, [_message_key_fields(message) for message in history]],
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# 持久化文件中记录 `键 -> 写入时间` 的索引条目；缓存键都是十六进制摘要，不会与之冲突。
+_INDEX_KEY = "__index__"
+
+
+@dataclass
+class LLMCache:
+    """基于 `OrderedDict` 的 LRU + TTL 缓存，可选用 `shelve` 持久化到磁盘。
+
+    只保存每次调用新增的尾部消息（历史前缀由缓存键保证一致），
+    存取时都做深拷贝，避免 micro_compact 等原地修改污染缓存内容。
+    设置 `path` 后写入同时落盘，内存未命中时回查磁盘，相同的提问跨会话也能直接回放；
+    磁盘读写失败只会退化为未命中，不影响正常调用。
+
+    Attributes:
+        max_items: 内存与磁盘各自保留的最大条目数。
+        ttl_seconds: 条目有效期（秒），按写入时的墙钟时间计算。
+        path: 持久化文件路径；为 `None` 时只缓存在内存中。
+        enabled: 是否启用；`/cache off` 会在当前会话内关闭缓存。
+        scope: 作用域摘要（项目根目录、模型名、系统提示），参与缓存键计算，
+            持久化文件跨项目共用时也不会回放其他项目的响应。
+    """
+
+    max_items: int = 256
+    ttl_seconds: float = 3600.0
+    path: Path | None = None
+    enabled: bool = True
+    scope: str = ""
+    _entries: OrderedDict[str, tuple[float, list[Any]]] = field(default_factory=OrderedDict)
+
+    def key_for(self, history: list[Any]) -> str:
+        """计算 `history` 在本缓存作用域下的缓存键。"""
+        return history_cache_key(history, self.scope)
+
+    def get(self, key: str) -> list[Any] | None:
+        """读取缓存；过期、不存在或已关闭时返回 `None`。"""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load_persisted(key)
+            if entry is None:
+                return None
+            self._entries[key] = entry
+        stored_at, messages = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self._delete_persisted(key)
+            return None
+        self._entries.move_to_end(key)
+        self._evict_memory()
+        return copy.deepcopy(messages)
+
+    def set(self, key: str, messages: list[Any]) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目。"""
+        if not self.enabled:
+            return
+        entry = (time.time(), copy.deepcopy(messages))
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._evict_memory()
+        self._store_persisted(key, entry)
+
+    def clear(self) -> None:
+        """清空内存与磁盘上的缓存。"""
+        self._entries.clear()
+        if self.path is None:
+            return
+        try:
+            with shelve.open(str(self.path)) as db:
+                db.clear()
+        except Exception:
+            pass
+
+    def _evict_memory(self) -> None:
+        """淘汰内存中超出容量的最久未使用条目。"""
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+    def _load_persisted(self, key: str) -> tuple[float, list[Any]] | None:
+        """从磁盘读取单个条目；未持久化或读取失败时返回 `None`。"""
+        if self.path is None:
+            return None
+        try:
+            with shelve.open(str(self.path), flag="r") as db:
+                entry = db.get(key)
+        except Exception:
+            return None
+        return entry if isinstance(entry, tuple) and len(entry) == 2 else None
+
+    def _store_persisted(self, key: str, entry: tuple[float, list[Any]]) -> None:
+        """把条目写入磁盘；超出容量时丢弃过期条目和写入最早的条目。
+
+        淘汰只读取 `_INDEX_KEY` 下的写入时间索引，不反序列化任何已存的消息列表。
+        """
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with shelve.open(str(self.path)) as db:
+                index = self._persisted_index(db)
+                db[key] = entry
+                index[key] = entry[0]
+                if len(index) > self.max_items:
+                    now = time.time()
+                    excess = len(index) - self.max_items
+                    for old_key, stored_at in sorted(index.items(), key=lambda item: item[1]):
+                        if excess <= 0 and now - stored_at <= self.ttl_seconds:
+                            break
+                        db.pop(old_key, None)
+                        del index[old_key]
+                        excess -= 1
+                db[_INDEX_KEY] = index
+        except Exception:
+            pass
+
+    @staticmethod
+    def _persisted_index(db: shelve.Shelf) -> dict[str, float]:
+        """读取写入时间索引；旧文件没有索引时按现有条目重建一次。"""
+        index = db.get(_INDEX_KEY)
+        if isinstance(index, dict):
+            return index
+        rebuilt: dict[str, float] = {}
+        for key in list(db.keys()):
+            entry = db.get(key)
+            if isinstance(entry, tuple) and len(entry) == 2:
+                rebuilt[key] = entry[0]
+        return rebuilt
+
+    def _delete_persisted(self, key: str) -> None:
+        """从磁盘删除单个条目。"""
+        if self.path is None:
+            return
+        try:
+            with shelve.open(str(self.path)) as db:
+                db.pop(key, None)
+                index = db.get(_INDEX_KEY)
+                if isinstance(index, dict) and index.pop(key, None) is not None:
+                    db[_INDEX_KEY] = index
+        except Exception:
+            pass
+
+
+def build_llm_cache(scope: str = "") -> LLMCache | None:
+    """根据环境变量创建响应缓存。
+
+    LLM 输出并非确定性，默认关闭；设置 `MINICC_CACHE=1` 后启用。
+    缓存默认持久化到 `~/.minicc/llm_cache`，`MINICC_CACHE_PATH` 可改路径，设为空则只缓存在内存中。
+
+    Args:
+        scope: 决定响应是否可复用的上下文（项目根目录、模型名、系统提示等），
+            以摘要形式参与缓存键；任一部分变化都不会命中旧条目。
+
+    Returns:
+        `LLMCache`；未启用时返回 `None`。
+    """
+    enabled = os.getenv("MINICC_CACHE", "").strip().lower() in ("1", "true", "yes", "on")
+    if not enabled:
+        return None
+    max_items = int(os.getenv("MINICC_CACHE_MAX_ITEMS", "256"))
+    ttl_seconds = float(os.getenv("MINICC_CACHE_TTL", "3600"))
+    raw_path = os.getenv("MINICC_CACHE_PATH", str(Path.home() / ".minicc" / "llm_cache")).strip()
+    path = Path(raw_path).expanduser() if raw_path else None
+    scope_digest = hashlib.sha256(scope.encode("utf-8")).hexdigest()
+    return LLMCache(max_items=max_items, ttl_seconds=ttl_seconds, path=path, scope=scope_digest)
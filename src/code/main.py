@@ -1,23 +1,30 @@
 """MiniClaude 主入口：初始化 agent 并驱动交互主循环。"""
 
+import functools
 import json
 import os
 import sys
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from deepagents import create_deep_agent
 from dotenv import load_dotenv
-from langchain_anthropic import ChatAnthropic
 
-from src.code.prompts import SYSTEM_PROMPT_UNIFIED
-from src.code.sandbox import SimpleSandboxBackend
-from src.code.controller import build_routed_input, parse_selection_command, render_active_selection
+from src.code.prompts import SYSTEM_PROMPT_TAIL, render_system_prompt_prefix
+from src.code.controller import (
+    BatchQueue,
+    build_routed_input,
+    parse_selection_command,
+    render_active_selection,
+    render_batch_results,
+)
 from src.code.background_tasks import BackgroundManager, build_background_tools
-from src.code.context_compact import build_context_compactor
+from src.code.context_compact import ContextCompactor, build_context_compactor
+from src.code.llm_cache import LLMCache, build_llm_cache
 from src.code.task_system import TaskManager, build_task_tools
 from src.code.teams import MessageBus, TeammateManager, build_team_tools, inject_lead_inbox_messages
 from src.code.team_protocols import TeamProtocolManager, build_team_protocol_tools
@@ -36,43 +43,80 @@ from src.code.subagents import (
     handle_subagent_command,
     to_deepagents_subagents,
 )
-from src.code.session_helpers import inject_background_notifications, render_compact_status
-from src.code.todos import TodoRenderState
-from src.code.stream_runtime import ToolRenderState, print_turn, stream_with_retry
+from src.code.session_helpers import (
+    handle_cache_command,
+    inject_background_notifications,
+    render_compact_status,
+)
+from src.code.todos import TodoRenderState, message_fields
+from src.code.stream_runtime import TurnPrinter, network_errors, stream_with_retry
+
+if TYPE_CHECKING:
+    from langchain_core.messages import HumanMessage, SystemMessage
 
 
 ENV_PATH = PROJECT_ROOT / ".env"
-load_dotenv(ENV_PATH)
-
-try:
-    from src.tools.web_search import internet_search
-except Exception:
-    internet_search = None
-
-API_KEY = os.getenv("API_KEY")
-BASE_URL = os.getenv("BASE_URL")
-MODEL = os.getenv("MODEL_NAME", "kimi-k2-turbo-preview")
-SANDBOX_REFRESH_EACH_EXECUTE = os.getenv("SANDBOX_REFRESH_EACH_EXECUTE", "true").strip().lower() in (
-    "1",
-    "true",
-    "yes",
-    "on",
-)
 WORKDIR = Path.cwd()
 SKILLS_DIR = PROJECT_ROOT / "src" / "skills"
 TASKS_DIR = WORKDIR / ".tasks"
 TEAM_DIR = WORKDIR / ".team"
 WORKTREES_DIR = WORKDIR / ".worktrees"
-BACKEND = SimpleSandboxBackend(
-    root_dir=PROJECT_ROOT,
-    virtual_mode=True,
-    refresh_each_execute=SANDBOX_REFRESH_EACH_EXECUTE,
-)
 
-SKILLS = discover_skills(SKILLS_DIR)
-SKILL_ALIASES = build_skill_aliases(SKILLS)
 
+@functools.cache
+def _load_env() -> None:
+    """加载 `.env`（只执行一次）；所有读取环境变量的构建函数都先调用它。"""
+    load_dotenv(ENV_PATH)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    """把环境变量解析为布尔开关。"""
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """启动横幅与运行时共用的环境配置。"""
+
+    sandbox_refresh_each_execute: bool
+    sandbox_persistent_shell: bool
+    recursion_limit: int
+    tool_concurrency_limit: int | None
+
+
+@functools.cache
+def get_settings() -> Settings:
+    """加载 `.env` 并读取配置；只解析环境变量，不导入任何重量级依赖。"""
+    _load_env()
+    return Settings(
+        sandbox_refresh_each_execute=_env_flag("SANDBOX_REFRESH_EACH_EXECUTE", "true"),
+        sandbox_persistent_shell=_env_flag("SANDBOX_PERSISTENT_SHELL", "false"),
+        recursion_limit=int(os.getenv("RECURSION_LIMIT", "200")),
+        tool_concurrency_limit=int(os.getenv("TOOL_CONCURRENCY_LIMIT", "0")) or None,
+    )
+
+
+@functools.cache
+def get_skills() -> dict[str, str]:
+    """首次访问时扫描 skills 目录，之后复用结果。"""
+    return discover_skills(SKILLS_DIR)
+
+
+@functools.cache
+def get_skill_aliases() -> dict[str, str]:
+    """返回 skill 别名索引（惰性构建）。"""
+    return build_skill_aliases(get_skills())
+
+
+@functools.cache
+def get_skill_descriptions() -> str:
+    """返回系统提示使用的 skill 描述文本（惰性构建）。"""
+    return build_skill_descriptions(get_skills())
+
+
+# subagent 配置在进程内不可变（只读 tuple），描述文本与索引都只在导入时构建一次。
 SUBAGENTS = DEFAULT_SUBAGENTS
+SUBAGENT_DESCRIPTIONS = build_subagent_descriptions(SUBAGENTS)
 DEEPAGENT_SUBAGENTS = to_deepagents_subagents(SUBAGENTS)
 SUBAGENT_BY_NAME = build_subagent_by_name(SUBAGENTS)
 SUBAGENT_SKILLS = {
@@ -80,42 +124,22 @@ SUBAGENT_SKILLS = {
     "backend-engineer": ["mcp-builder", "code-reviewer"],
     "test-engineer": ["unit-testing", "smoke-testing", "code-reviewer"],
 }
-SUBAGENT_DESCRIPTIONS = build_subagent_descriptions(SUBAGENTS)
-SKILL_DESCRIPTIONS = build_skill_descriptions(SKILLS)
-
-RECURSION_LIMIT = int(os.getenv("RECURSION_LIMIT", "200"))
-
-llm = ChatAnthropic(api_key=API_KEY, base_url=BASE_URL, model=MODEL)
-compactor = build_context_compactor(llm, WORKDIR)
-task_manager = TaskManager(TASKS_DIR)
-task_tools = build_task_tools(task_manager)
-background_manager = BackgroundManager(WORKDIR)
-background_tools = build_background_tools(background_manager)
-teammate_manager = TeammateManager(TEAM_DIR)
-message_bus = MessageBus(TEAM_DIR / "inbox")
-team_tools = build_team_tools(teammate_manager, message_bus)
-team_protocol_manager = TeamProtocolManager(TEAM_DIR, message_bus, teammate_manager)
-team_protocol_tools = build_team_protocol_tools(team_protocol_manager)
-autonomous_manager = AutonomousAgentManager(teammate_manager, task_manager, message_bus)
-autonomous_tools = build_autonomous_tools(autonomous_manager)
-worktree_manager = WorktreeManager(PROJECT_ROOT, WORKTREES_DIR, task_manager)
-worktree_tools = build_worktree_tools(worktree_manager)
-
-agent_tools = [
-    *task_tools,
-    *background_tools,
-    *team_tools,
-    *team_protocol_tools,
-    *autonomous_tools,
-    *worktree_tools,
-]
-if internet_search is not None:
-    agent_tools.append(internet_search)
-
-agent = create_deep_agent(
-    model=llm,
-    tools=agent_tools,
-    system_prompt=SYSTEM_PROMPT_UNIFIED.format(
+
+
+@functools.cache
+def _build_system_prompt() -> "SystemMessage":
+    """渲染系统提示并缓存结果。
+
+    静态前缀在进程生命周期内不变，打上 `cache_control` 断点让 Anthropic 缓存这段前缀；
+    对话历史的断点由 deepagents 内置的 `AnthropicPromptCachingMiddleware` 负责。
+    重复调用（例如测试中多次构建 agent）直接复用首次渲染的结果。
+
+    Returns:
+        由静态前缀块与尾部块组成的 `SystemMessage`。
+    """
+    from langchain_core.messages import SystemMessage
+
+    prefix = render_system_prompt_prefix(
         workdir=WORKDIR,
         tools=(
             "- write_todos: manage todo list\n"
@@ -142,14 +166,125 @@ agent = create_deep_agent(
             "internet_search, skill"
         ),
         subagent_descriptions=SUBAGENT_DESCRIPTIONS,
-        skill_descriptions=SKILL_DESCRIPTIONS,
-        input="{input}",
-        agent_scratchpad="{agent_scratchpad}",
-    ),
-    subagents=DEEPAGENT_SUBAGENTS,
-    skills=["/src/skills"],
-    backend=BACKEND,
-)
+        skill_descriptions=get_skill_descriptions(),
+    )
+    return SystemMessage(
+        content=[
+            {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": SYSTEM_PROMPT_TAIL},
+        ]
+    )
+
+
+def _user_message(content: str) -> "HumanMessage":
+    """构造本轮用户消息。
+
+    直接以 LangChain 消息对象写入 history，agent 返回的历史本就是消息对象，
+    这样每轮传给 agent 的整段历史都无需再由 dict 转换。
+
+    Args:
+        content: 路由后的用户输入。
+
+    Returns:
+        `HumanMessage` 实例。
+    """
+    from langchain_core.messages import HumanMessage
+
+    return HumanMessage(content=content)
+
+
+@dataclass
+class Runtime:
+    """一次会话所需的运行时对象：LLM、agent 以及各类管理器。"""
+
+    agent: Any
+    compactor: ContextCompactor
+    llm_cache: LLMCache | None
+    background_manager: BackgroundManager
+    teammate_manager: TeammateManager
+    message_bus: MessageBus
+    autonomous_manager: AutonomousAgentManager
+
+
+@functools.cache
+def _get_runtime() -> Runtime:
+    """构建并缓存运行时（LLM 客户端、工具、agent）。
+
+    导入本模块只定义常量与辅助函数；deepagents/LangChain 的导入、LLM 客户端与 agent 的构建
+    推迟到首次调用。主循环也只在真正需要时才触发构建，启动后直接退出不会付出这部分开销。
+
+    Returns:
+        进程内唯一的 `Runtime`。
+    """
+    settings = get_settings()
+    from deepagents import create_deep_agent
+    from langchain_anthropic import ChatAnthropic
+
+    from src.code.sandbox import SimpleSandboxBackend
+
+    try:
+        from src.tools.web_search import internet_search
+    except Exception:
+        internet_search = None
+
+    backend = SimpleSandboxBackend(
+        root_dir=PROJECT_ROOT,
+        virtual_mode=True,
+        refresh_each_execute=settings.sandbox_refresh_each_execute,
+        persistent_shell=settings.sandbox_persistent_shell,
+    )
+    model_name = os.getenv("MODEL_NAME", "kimi-k2-turbo-preview")
+    llm = ChatAnthropic(
+        api_key=os.getenv("API_KEY"),
+        base_url=os.getenv("BASE_URL"),
+        model=model_name,
+    )
+    compactor = build_context_compactor(llm, WORKDIR)
+    # 缓存的回复里含有工具在本项目中的执行结果，换项目、模型或系统提示后都不能复用。
+    llm_cache = build_llm_cache(
+        scope=json.dumps(
+            [str(PROJECT_ROOT), model_name, _build_system_prompt().content],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+    )
+    task_manager = TaskManager(TASKS_DIR)
+    background_manager = BackgroundManager(WORKDIR)
+    teammate_manager = TeammateManager(TEAM_DIR)
+    message_bus = MessageBus(TEAM_DIR / "inbox")
+    team_protocol_manager = TeamProtocolManager(TEAM_DIR, message_bus, teammate_manager)
+    autonomous_manager = AutonomousAgentManager(teammate_manager, task_manager, message_bus)
+    worktree_manager = WorktreeManager(PROJECT_ROOT, WORKTREES_DIR, task_manager)
+
+    agent_tools = [
+        *build_task_tools(task_manager),
+        *build_background_tools(background_manager),
+        *build_team_tools(teammate_manager, message_bus),
+        *build_team_protocol_tools(team_protocol_manager),
+        *build_autonomous_tools(autonomous_manager),
+        *build_worktree_tools(worktree_manager),
+    ]
+    if internet_search is not None:
+        agent_tools.append(internet_search)
+
+    agent = create_deep_agent(
+        model=llm,
+        tools=agent_tools,
+        system_prompt=_build_system_prompt(),
+        subagents=DEEPAGENT_SUBAGENTS,
+        skills=["/src/skills"],
+        backend=backend,
+    )
+    return Runtime(
+        agent=agent,
+        compactor=compactor,
+        llm_cache=llm_cache,
+        background_manager=background_manager,
+        teammate_manager=teammate_manager,
+        message_bus=message_bus,
+        autonomous_manager=autonomous_manager,
+    )
+
 
 def main() -> None:
     """运行交互式命令行会话。
@@ -162,22 +297,30 @@ def main() -> None:
     Returns:
         None。用户退出后函数结束。
     """
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=True)
+
+    # 运行时（LLM 客户端、agent、各管理器）在第一次真正用到时才构建。
+    settings = get_settings()
+
     print("Mini Claude v5 (deepagents) - interactive. Type 'exit' to quit.\n")
     print(f"Loaded env from: {ENV_PATH}")
     print("Skills source: /src/skills (deepagents managed)")
-    print("Commands: /skill, /subagent, /status, /compact, /team, /inbox")
-    print(f"Sandbox refresh_each_execute: {SANDBOX_REFRESH_EACH_EXECUTE}")
+    print("Commands: /skill, /subagent, /status, /compact, /team, /inbox, /cache, /batch")
+    print(f"Sandbox refresh_each_execute: {settings.sandbox_refresh_each_execute}")
+    print(f"Sandbox persistent_shell: {settings.sandbox_persistent_shell}")
     print(f"Tasks directory: {TASKS_DIR}")
     print(f"Team directory: {TEAM_DIR}")
     print(f"Worktrees directory: {WORKTREES_DIR}")
-    print(f"Agent recursion_limit: {RECURSION_LIMIT}")
+    print(f"Agent recursion_limit: {settings.recursion_limit}")
+    print(f"Tool concurrency limit: {settings.tool_concurrency_limit or '(default)'}")
 
-    history: list[dict[str, str]] = []
+    history: list[Any] = []
     selected_skill: str | None = None
     selected_subagent: str | None = None
+    batch_queue = BatchQueue()
 
-    todo_state = TodoRenderState()
-    tool_state = ToolRenderState()
+    printer = TurnPrinter(TodoRenderState(), SUBAGENT_SKILLS)
 
     while True:
         try:
@@ -185,17 +328,18 @@ def main() -> None:
         except (EOFError, KeyboardInterrupt):
             break
 
-        if not user_input or user_input.lower() in ("exit", "quit", "q"):
+        command = user_input.lower()
+        if not user_input or command in ("exit", "quit", "q"):
             break
 
-        if user_input.strip().lower() == "/status":
+        if command == "/status":
             print("\n" + render_active_selection(selected_skill, selected_subagent))
-            print(render_compact_status(compactor))
+            print(render_compact_status(_get_runtime().compactor))
             print()
             continue
 
-        if user_input.strip().lower() == "/team":
-            members = teammate_manager.list_members()
+        if command == "/team":
+            members = _get_runtime().teammate_manager.list_members()
             print("\nTeam:")
             if not members:
                 print("(empty)")
@@ -206,8 +350,8 @@ def main() -> None:
             print()
             continue
 
-        if user_input.strip().lower() == "/inbox":
-            inbox = message_bus.read_inbox("lead", drain=True)
+        if command == "/inbox":
+            inbox = _get_runtime().message_bus.read_inbox("lead", drain=True)
             print("\nLead Inbox:")
             if not inbox:
                 print("(empty)")
@@ -218,13 +362,18 @@ def main() -> None:
             print()
             continue
 
+        if command.split(maxsplit=1)[0] == "/cache":
+            handle_cache_command(command, _get_runtime().llm_cache)
+            print()
+            continue
+
         if user_input.startswith("/compact"):
             parts = user_input.split(maxsplit=1)
             focus = parts[1].strip() if len(parts) == 2 else None
             if not history:
                 print("No conversation yet. Nothing to compact.")
             else:
-                history = compactor.manual_compact(history, focus=focus)
+                history = _get_runtime().compactor.manual_compact(history, focus=focus)
                 print("[manual compact] conversation compressed.")
             print(render_active_selection(selected_skill, selected_subagent))
             print()
@@ -236,61 +385,74 @@ def main() -> None:
             selected_subagent,
             handle_skill_command=handle_skill_command,
             handle_subagent_command=handle_subagent_command,
-            skills=SKILLS,
-            skill_aliases=SKILL_ALIASES,
+            skills=get_skills(),
+            skill_aliases=get_skill_aliases(),
             subagent_by_name=SUBAGENT_BY_NAME,
+            batch_queue=batch_queue,
         )
         if handled:
             print()
             continue
 
         routed_input = build_routed_input(task_text or user_input, selected_skill, selected_subagent)
+        runtime = _get_runtime()
 
-        injected_count = inject_background_notifications(history, background_manager)
+        injected_count = inject_background_notifications(history, runtime.background_manager)
         if injected_count:
             print(f"[background] injected {injected_count} finished task result(s).")
 
-        team_injected_count = inject_lead_inbox_messages(history, message_bus, lead_name="lead")
+        team_injected_count = inject_lead_inbox_messages(history, runtime.message_bus, lead_name="lead")
         if team_injected_count:
             print(f"[team] injected {team_injected_count} inbox message(s).")
 
-        autonomous_events = autonomous_manager.tick_idle_teammates()
+        autonomous_events = runtime.autonomous_manager.tick_idle_teammates()
         autonomous_injected_count = inject_autonomous_events(history, autonomous_events)
         if autonomous_injected_count:
             print(f"[autonomy] injected {autonomous_injected_count} scheduler event(s).")
 
         # 每轮把用户输入写入history
-        history.append({"role": "user", "content": routed_input})
-        compactor.micro_compact(history)
-        history, auto_compacted = compactor.maybe_auto_compact(history)
+        history.append(_user_message(routed_input))
+        runtime.compactor.micro_compact(history)
+        history, auto_compacted = runtime.compactor.maybe_auto_compact(history)
         if auto_compacted:
             print("[auto_compact triggered] conversation compressed.")
+        else:
+            history, windowed = runtime.compactor.maybe_window_compact(history)
+            if windowed:
+                print(f"[history window] older turns summarized; kept the last {len(history) - 2} message(s).")
 
+        succeeded = False
         try:
-            start_index = len(history)
             history = stream_with_retry(
-                agent,
+                runtime.agent,
                 history,
-                start_index,
-                RECURSION_LIMIT,
-                lambda messages, printed_index: print_turn(
-                    messages,
-                    printed_index,
-                    todo_state,
-                    tool_state,
-                    SUBAGENT_SKILLS,
-                ),
+                settings.recursion_limit,
+                printer,
+                cache=runtime.llm_cache,
+                max_concurrency=settings.tool_concurrency_limit,
             )
+            succeeded = True
         except json.JSONDecodeError:
             print("Error: API 返回内容为空或格式错误，请稍后重试。")
+        except network_errors() as exc:
+            print(f"Error: 网络连接失败或超时（{type(exc).__name__}），history 未改变，可直接重试。")
         except Exception as exc:
-            if "Recursion limit" in str(exc):
+            message = str(exc)
+            if "Recursion limit" in message:
                 print(
                     "Error: Agent reached recursion limit before finishing. "
                     "Try narrowing the task scope, selecting a skill/subagent explicitly, "
                     "or increasing RECURSION_LIMIT in .env."
                 )
-            print(f"Error during agent invoke: {exc}")
+            print(f"Error during agent invoke: {type(exc).__name__}: {message}")
+
+        if batch_queue.dispatched:
+            if succeeded:
+                print(render_batch_results(batch_queue.dispatched, message_fields(history[-1])[0]))
+            else:
+                batch_queue.pending[:0] = batch_queue.dispatched
+                print(f"[batch] call failed; {len(batch_queue.dispatched)} task(s) returned to the queue.")
+            batch_queue.dispatched = []
 
         print(render_active_selection(selected_skill, selected_subagent))
         print()
@@ -1,13 +1,39 @@
 """系统提示模板。
 
-占位符由 `main.py` 在 agent 初始化时注入，例如：
+静态前缀由 `render_system_prompt_prefix` 在 agent 初始化时渲染，参数包括：
 - `{workdir}`: 当前工作目录
 - `{tools}` / `{tool_names}`: 可用工具说明
 - `{skill_descriptions}` / `{subagent_descriptions}`: 能力清单
-- `{input}` / `{agent_scratchpad}`: deepagents 运行时字段
+
+模板拆为静态前缀与尾部两段：前缀只含启动期即可确定的内容，
+便于作为 prompt cache 的断点；尾部 `SYSTEM_PROMPT_TAIL` 原样保留
+`{input}` / `{agent_scratchpad}` 这两个 deepagents 运行时字段。
 """
 
-SYSTEM_PROMPT_UNIFIED = """You are a coding agent at {workdir}.
+
+def render_system_prompt_prefix(
+    *,
+    workdir: object,
+    tools: str,
+    tool_names: str,
+    skill_descriptions: str,
+    subagent_descriptions: str,
+) -> str:
+    """渲染系统提示的静态前缀。
+
+    直接用 f-string 拼装，尾部的运行时占位符不再需要经过 `str.format` 转义透传。
+
+    Args:
+        workdir: 当前工作目录。
+        tools: 工具说明（多行）。
+        tool_names: 逗号分隔的工具名。
+        skill_descriptions: skill 能力清单。
+        subagent_descriptions: subagent 能力清单。
+
+    Returns:
+        静态前缀文本。
+    """
+    return f"""You are a coding agent at {workdir}.
 
 Available tools:
 {tools}
@@ -42,7 +68,21 @@ Observation: the result of the action
 Thought: I now know the final answer
 Final Answer: the final answer to the original input question
 
-Begin!
+Begin!"""
+
+
+SYSTEM_PROMPT_TAIL = """
 
 Question: {input}
 Thought:{agent_scratchpad}"""
+
+# 保留 `str.format` 风格模板，兼容仍按旧方式格式化的调用方。
+SYSTEM_PROMPT_PREFIX_TEMPLATE = render_system_prompt_prefix(
+    workdir="{workdir}",
+    tools="{tools}",
+    tool_names="{tool_names}",
+    skill_descriptions="{skill_descriptions}",
+    subagent_descriptions="{subagent_descriptions}",
+)
+
+SYSTEM_PROMPT_UNIFIED = SYSTEM_PROMPT_PREFIX_TEMPLATE + SYSTEM_PROMPT_TAIL
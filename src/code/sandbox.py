@@ -1,17 +1,174 @@
 from __future__ import annotations
 
+import math
 import os
 import re
 import resource
+import secrets
+import selectors
+import shlex
 import shutil
+import signal
+import stat
 import subprocess
 import tempfile
-import uuid
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 from deepagents.backends.filesystem import FilesystemBackend
 from deepagents.backends.protocol import ExecuteResponse, SandboxBackendProtocol
 
+try:
+    import hyperscan
+except Exception:
+    hyperscan = None
+
+
+def _remove_path(path: str) -> None:
+    """删除文件、符号链接或目录树。"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+_HAS_COPY_FILE_RANGE = hasattr(os, "copy_file_range")
+_COPY_CHUNK_BYTES = 1 << 30
+
+
+def _copy_file(src: str, dst: str) -> None:
+    """复制单个文件并保留元数据，行为与 `shutil.copy2` 一致。
+
+    优先使用 `os.copy_file_range`：数据在内核内部搬运，btrfs/xfs 等文件系统上还会直接共享数据块（reflink）；
+    不支持时（旧内核、跨文件系统等）回退到 `shutil.copy2`。不使用硬链接，
+    否则命令在工作区内的原地写入会改到仓库文件本身。
+
+    Args:
+        src: 源文件路径。
+        dst: 目标文件路径（不存在或将被覆盖）。
+    """
+    if _HAS_COPY_FILE_RANGE:
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), _COPY_CHUNK_BYTES):
+                    pass
+        except OSError:
+            pass
+        else:
+            shutil.copystat(src, dst)
+            return
+    shutil.copy2(src, dst)
+
+
+def _append_capped(buffer: bytearray, data: bytes | bytearray, limit: int) -> bool:
+    """把 `data` 追加到 `buffer`，总长度不超过 `limit`；有字节被丢弃时返回 `True`。"""
+    room = limit - len(buffer)
+    if room > 0:
+        buffer.extend(memoryview(data)[:room])
+    return room < len(data)
+
+
+def _sync_tree(
+    src: str,
+    dst: str,
+    ignore,
+    previous: dict[str, tuple[int, int]],
+    current: dict[str, tuple[int, int]],
+) -> None:
+    """把 `src` 目录增量同步到 `dst`，语义与 `copytree(symlinks=False, ignore=ignore)` 的结果一致。
+
+    文件只有在 `(size, mtime_ns, mode)` 与源文件一致、且工作区副本的 `(st_ino, st_ctime_ns)`
+    与上次复制后记录的一致时才跳过。mtime 可以被 `touch -r`、`cp -p` 等还原，ctime 无法在用户态设置，
+    副本被改写过就一定会重新复制。
+
+    Args:
+        src: 源目录。
+        dst: 已存在的目标目录。
+        ignore: `shutil.ignore_patterns` 返回的过滤函数。
+        previous: 上次同步记录的 `目标路径 -> (st_ino, st_ctime_ns)`。
+        current: 本次同步写入的记录，供下次同步使用。
+    """
+    names = os.listdir(src)
+    ignored = ignore(src, names)
+    kept: set[str] = set()
+    for name in names:
+        if name in ignored:
+            continue
+        src_path = os.path.join(src, name)
+        dst_path = os.path.join(dst, name)
+        try:
+            src_stat = os.stat(src_path)
+        except OSError:
+            continue
+        try:
+            dst_stat = os.lstat(dst_path)
+        except FileNotFoundError:
+            dst_stat = None
+        kept.add(name)
+
+        if stat.S_ISDIR(src_stat.st_mode):
+            if dst_stat is not None and not stat.S_ISDIR(dst_stat.st_mode):
+                _remove_path(dst_path)
+                dst_stat = None
+            if dst_stat is None:
+                os.mkdir(dst_path)
+            elif stat.S_IMODE(dst_stat.st_mode) & stat.S_IRWXU != stat.S_IRWXU:
+                # 只读目录无法增删子项：同步期间临时放开属主权限，结束后由 copystat 还原。
+                os.chmod(dst_path, stat.S_IMODE(dst_stat.st_mode) | stat.S_IRWXU)
+            _sync_tree(src_path, dst_path, ignore, previous, current)
+            # 与 `copytree` 一样在复制完内容后再复制目录元数据，否则只读目录会挡住子项的写入。
+            shutil.copystat(src_path, dst_path)
+            continue
+
+        if (
+            dst_stat is not None
+            and stat.S_ISREG(dst_stat.st_mode)
+            and dst_stat.st_size == src_stat.st_size
+            and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+            and dst_stat.st_mode == src_stat.st_mode
+            and previous.get(dst_path) == (dst_stat.st_ino, dst_stat.st_ctime_ns)
+        ):
+            current[dst_path] = previous[dst_path]
+            continue
+        if dst_stat is not None:
+            _remove_path(dst_path)
+        _copy_file(src_path, dst_path)
+        copied = os.lstat(dst_path)
+        current[dst_path] = (copied.st_ino, copied.st_ctime_ns)
+
+    for name in os.listdir(dst):
+        if name not in kept:
+            _remove_path(os.path.join(dst, name))
+
+
+def _build_blocked_database(patterns: list[str]) -> object | None:
+    """把阻断规则编译为单个 Hyperscan 数据库；未安装 hyperscan 或编译失败时返回 `None`。
+
+    所有规则合并为一个自动机，扫描开销只与命令长度有关，与规则条数无关，且没有回溯。
+
+    Args:
+        patterns: 阻断正则列表（不区分大小写、按 Unicode 语义匹配）。
+
+    Returns:
+        编译好的 `hyperscan.Database`，或 `None`。
+    """
+    if hyperscan is None:
+        return None
+    flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+    try:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[pattern.encode("utf-8") for pattern in patterns],
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=[flags] * len(patterns),
+        )
+    except Exception:
+        return None
+    return database
+
 
 class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
     """A minimal local sandbox backend for command execution.
@@ -32,6 +189,19 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
         r"rm\s+-rf\s+/",
         r"dd\s+if=",
     ]
+    _WORKSPACE_IGNORE_PATTERNS = (
+        ".git",
+        ".venv",
+        "__pycache__",
+        ".pytest_cache",
+        ".mypy_cache",
+        ".sandbox",
+    )
+    # 全部规则合并为一个预编译的交替模式：一次扫描完成匹配，大小写由正则引擎处理。
+    _BLOCKED_RE = re.compile("|".join(f"(?:{pattern})" for pattern in _BLOCKED_PATTERNS), re.IGNORECASE)
+    # 可用时优先使用 Hyperscan；scratch 空间不能并发使用，扫描需串行。
+    _BLOCKED_DB = _build_blocked_database(_BLOCKED_PATTERNS)
+    _BLOCKED_DB_LOCK = threading.Lock()
 
     def __init__(
         self,
@@ -44,6 +214,7 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
         cpu_time_limit_seconds: int = 10,
         memory_limit_mb: int = 512,
         file_size_limit_mb: int = 16,
+        persistent_shell: bool = False,
     ) -> None:
         """初始化沙箱后端实例。
 
@@ -56,6 +227,8 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
             cpu_time_limit_seconds: 子进程 CPU 时间上限（秒）。
             memory_limit_mb: 子进程内存上限（MB）。
             file_size_limit_mb: 子进程可写文件大小上限（MB）。
+            persistent_shell: 是否复用一个常驻 bash 执行命令（省去每条命令的进程创建，
+                环境变量与 shell 状态会在命令间保留）。
 
         Returns:
             None。
@@ -67,10 +240,18 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
         self._cpu_time_limit_seconds = cpu_time_limit_seconds
         self._memory_limit_bytes = memory_limit_mb * 1024 * 1024
         self._file_size_limit_bytes = file_size_limit_mb * 1024 * 1024
-        self._sandbox_id = f"simple-sandbox-{uuid.uuid4().hex[:8]}"
+        self._sandbox_id = f"simple-sandbox-{secrets.token_hex(4)}"
         self._sandbox_base = Path(tempfile.gettempdir()) / self._sandbox_id
+        # 沙箱目录不在构造时创建：首次 execute 同步工作区时会连同父目录一起建好。
         self._workspace = self._sandbox_base / "workspace"
-        self._sandbox_base.mkdir(parents=True, exist_ok=True)
+        # 命令结束后在后台预先同步工作区，让清理上一条命令产物的开销与模型/用户的思考时间重叠。
+        self._refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sandbox-refresh")
+        self._refresh_future: Future[None] | None = None
+        # 上次同步后工作区内各文件副本的 `(st_ino, st_ctime_ns)`，用于识别被命令改写过的副本。
+        self._copy_stamps: dict[str, tuple[int, int]] = {}
+        self._persistent_shell = persistent_shell
+        self._shell: subprocess.Popen | None = None
+        self._shell_lock = threading.Lock()
 
     @property
     def id(self) -> str:
@@ -90,11 +271,23 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
         Returns:
             `True` 表示命中黑名单策略，不允许执行。
         """
-        lowered = command.lower()
-        return any(re.search(pattern, lowered) for pattern in self._BLOCKED_PATTERNS)
+        if self._BLOCKED_DB is None:
+            return self._BLOCKED_RE.search(command) is not None
+        hits: list[int] = []
+        with self._BLOCKED_DB_LOCK:
+            self._BLOCKED_DB.scan(
+                command.encode("utf-8", errors="replace"),
+                match_event_handler=lambda pattern_id, start, end, flags, context: hits.append(pattern_id),
+            )
+        return bool(hits)
 
     def _refresh_workspace(self) -> None:
-        """重建隔离工作区并复制当前仓库快照。
+        """把隔离工作区同步为当前仓库快照。
+
+        不再每次整体删除后重新复制：逐目录比较，只复制 `(size, mtime_ns, mode)` 变化、
+        或副本自上次复制后被改动过（`(st_ino, st_ctime_ns)` 与记录不符）的文件，
+        并删除快照中多出的条目（包括上一条命令产生的文件）。还原 mtime 也无法伪造 ctime，
+        因此同步结果与完整复制一致。
 
         Args:
             None。
@@ -102,18 +295,32 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
         Returns:
             None。
         """
-        if self._workspace.exists():
-            shutil.rmtree(self._workspace)
-
-        ignore = shutil.ignore_patterns(
-            ".git",
-            ".venv",
-            "__pycache__",
-            ".pytest_cache",
-            ".mypy_cache",
-            ".sandbox",
-        )
-        shutil.copytree(self.cwd, self._workspace, symlinks=False, ignore=ignore)
+        ignore = shutil.ignore_patterns(*self._WORKSPACE_IGNORE_PATTERNS)
+        if self._workspace.is_symlink() or (self._workspace.exists() and not self._workspace.is_dir()):
+            _remove_path(str(self._workspace))
+        self._workspace.mkdir(parents=True, exist_ok=True)
+        stamps: dict[str, tuple[int, int]] = {}
+        # 同步中途失败时清空记录，下次同步全部重新复制。
+        self._copy_stamps, previous = {}, self._copy_stamps
+        _sync_tree(str(self.cwd), str(self._workspace), ignore, previous, stamps)
+        self._copy_stamps = stamps
+
+    def _schedule_refresh(self) -> None:
+        """在后台线程中提前同步工作区，供下一次 execute 复用。"""
+        self._refresh_future = self._refresh_executor.submit(self._refresh_workspace)
+
+    def _await_pending_refresh(self) -> None:
+        """等待尚未完成的后台同步。
+
+        后台同步失败时忽略异常：调用方随后会同步刷新一次并如实报告错误。
+        """
+        future, self._refresh_future = self._refresh_future, None
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception:  # noqa: BLE001
+            pass
 
     def _build_env(self) -> dict[str, str]:
         """构建子进程执行环境变量。
@@ -145,6 +352,14 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
             resource.RLIMIT_CPU,
             (self._cpu_time_limit_seconds, self._cpu_time_limit_seconds),
         )
+        self._preexec_shell_limits()
+
+    def _preexec_shell_limits(self) -> None:
+        """常驻 shell 的资源限制：不设 CPU 硬上限，由 `_run_in_shell` 按命令设置软上限。
+
+        RLIMIT_CPU 按进程累计计时，若直接作用于常驻 bash，会话累计的 CPU 时间迟早
+        会让 shell 本身被杀掉，而不是某条超时的命令。
+        """
         resource.setrlimit(
             resource.RLIMIT_FSIZE,
             (self._file_size_limit_bytes, self._file_size_limit_bytes),
@@ -157,6 +372,202 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
         except (ValueError, OSError):
             pass
 
+    def _run_capped(self, command: str) -> tuple[int, bytes, bytes, bool]:
+        """运行命令，stdout/stderr 各自最多保留 `max_output_bytes` 字节。
+
+        两个管道通过 selector 同时读取；超出上限的字节读出后直接丢弃（不终止命令），
+        因此内存占用与命令输出总量无关。超时后杀掉整个进程组。输出保持原始字节，
+        由调用方拼装、截断后统一解码一次。
+
+        Args:
+            command: 待执行的 shell 命令。
+
+        Returns:
+            `(returncode, stdout, stderr, overflowed)`；`overflowed` 表示有输出被丢弃。
+
+        Raises:
+            subprocess.TimeoutExpired: 超过 `timeout` 仍未结束。
+        """
+        limit = self._max_output_bytes
+        deadline = time.monotonic() + self._timeout
+        proc = subprocess.Popen(  # noqa: S602
+            command,
+            shell=True,
+            cwd=str(self._workspace),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self._build_env(),
+            preexec_fn=self._preexec_limits,
+            start_new_session=True,
+        )
+        stdout_buffer = bytearray()
+        stderr_buffer = bytearray()
+        buffers = {proc.stdout.fileno(): stdout_buffer, proc.stderr.fileno(): stderr_buffer}
+        overflowed = False
+        try:
+            with selectors.DefaultSelector() as selector:
+                for fd in buffers:
+                    selector.register(fd, selectors.EVENT_READ)
+                while selector.get_map():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(command, self._timeout)
+                    for key, _ in selector.select(remaining):
+                        data = os.read(key.fd, 65536)
+                        if not data:
+                            selector.unregister(key.fd)
+                            continue
+                        if _append_capped(buffers[key.fd], data, limit):
+                            overflowed = True
+            returncode = proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except BaseException:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            proc.wait()
+            raise
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+
+        return returncode, bytes(stdout_buffer), bytes(stderr_buffer), overflowed
+
+    def _ensure_shell(self) -> subprocess.Popen:
+        """返回存活的常驻 shell，必要时重新启动。"""
+        if self._shell is not None and self._shell.poll() is None:
+            return self._shell
+        self._close_shell()
+        self._shell = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            cwd=str(self._workspace),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self._build_env(),
+            preexec_fn=self._preexec_shell_limits,
+            start_new_session=True,
+        )
+        return self._shell
+
+    def _shell_cpu_budget(self, pid: int) -> int:
+        """返回本条命令的 CPU 软上限：shell 已累计的 CPU 秒数加上每条命令的上限。
+
+        累计时间从 `/proc/<pid>/stat` 读取；读不到时（非 Linux）按 0 计，上限退化为整个会话共享。
+        """
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as file:
+                # comm 字段可能含空格，从最后一个 ")" 之后开始切分；utime、stime 为第 14、15 个字段。
+                fields = file.read().rsplit(b")", 1)[1].split()
+            used = math.ceil((int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"))
+        except (OSError, IndexError, ValueError):
+            used = 0
+        return used + self._cpu_time_limit_seconds
+
+    def _close_shell(self) -> None:
+        """杀掉常驻 shell 所在的整个进程组并关闭管道。"""
+        shell, self._shell = self._shell, None
+        if shell is None:
+            return
+        try:
+            os.killpg(shell.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        shell.wait()
+        for pipe in (shell.stdin, shell.stdout, shell.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def _run_in_shell(self, command: str) -> tuple[int, bytes, bytes, bool]:
+        """在常驻 bash 中运行命令，返回值与 `_run_capped` 相同。
+
+        执行前用 `ulimit -S -t` 把 CPU 软上限设为 shell 已用时间加 `cpu_time_limit_seconds`，
+        因此限制按命令生效（命令启动的子进程继承同一软上限），shell 不会因会话累计用时被杀。
+        命令先写入沙箱目录下的脚本再 `source`，且 stdin 重定向自 `/dev/null`：
+        语法错误或读取 stdin 的命令都不会吞掉随后的结束标记。每条命令用随机标记分帧，
+        stdout 的标记后附带退出码。`refresh_each_execute` 时每条命令都从工作区根目录开始。
+        超时、读写失败或 shell 退出（如命令执行了 `exit`）时杀掉整个进程组，下次调用重新启动。
+
+        Args:
+            command: 待执行的 shell 命令。
+
+        Returns:
+            `(returncode, stdout, stderr, overflowed)`。
+
+        Raises:
+            subprocess.TimeoutExpired: 超过 `timeout` 仍未结束。
+        """
+        with self._shell_lock:
+            limit = self._max_output_bytes
+            deadline = time.monotonic() + self._timeout
+            shell = self._ensure_shell()
+            token = secrets.token_hex(8)
+            script = self._sandbox_base / "command.sh"
+            prefix = f"cd {shlex.quote(str(self._workspace))} || return 1\n" if self._refresh_each_execute else ""
+            script.write_text(prefix + command + "\n")
+
+            out_fd, err_fd = shell.stdout.fileno(), shell.stderr.fileno()
+            markers = {out_fd: f"\n__END_{token}__ ".encode(), err_fd: f"\n__END_{token}__\n".encode()}
+            pending = {out_fd: bytearray(), err_fd: bytearray()}
+            captured = {out_fd: bytearray(), err_fd: bytearray()}
+            returncode: int | None = None
+            overflowed = False
+            try:
+                shell.stdin.write(
+                    (
+                        f"ulimit -S -t {self._shell_cpu_budget(shell.pid)}\n"
+                        f". {shlex.quote(str(script))} < /dev/null\n"
+                        f"printf '\\n__END_{token}__ %d\\n' \"$?\"\n"
+                        f"printf '\\n__END_{token}__\\n' >&2\n"
+                    ).encode()
+                )
+                shell.stdin.flush()
+                with selectors.DefaultSelector() as selector:
+                    for fd in pending:
+                        selector.register(fd, selectors.EVENT_READ)
+                    while selector.get_map():
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise subprocess.TimeoutExpired(command, self._timeout)
+                        for key, _ in selector.select(remaining):
+                            fd = key.fd
+                            data = os.read(fd, 65536)
+                            buffer = pending[fd]
+                            if not data:
+                                selector.unregister(fd)
+                                overflowed |= _append_capped(captured[fd], buffer, limit)
+                                buffer.clear()
+                                continue
+                            buffer += data
+                            marker = markers[fd]
+                            index = buffer.find(marker)
+                            if index < 0:
+                                # 只保留可能是标记前缀的尾部，其余字节立即按上限收下。
+                                keep = len(marker) - 1
+                                if len(buffer) > keep:
+                                    overflowed |= _append_capped(captured[fd], buffer[:-keep], limit)
+                                    del buffer[:-keep]
+                                continue
+                            if fd == out_fd:
+                                end = buffer.find(b"\n", index + len(marker))
+                                if end < 0:
+                                    continue
+                                returncode = int(buffer[index + len(marker) : end])
+                            overflowed |= _append_capped(captured[fd], buffer[:index], limit)
+                            buffer.clear()
+                            selector.unregister(fd)
+            except BaseException:
+                self._close_shell()
+                raise
+
+            if returncode is None:
+                returncode = shell.wait()
+                self._close_shell()
+            return returncode, bytes(captured[out_fd]), bytes(captured[err_fd]), overflowed
+
     def execute(self, command: str) -> ExecuteResponse:
         """在隔离工作区内执行命令并返回统一结果。
 
@@ -178,18 +589,12 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
 
         try:
             if self._refresh_each_execute or not self._workspace.exists():
+                # 仓库可能在两次命令之间被文件工具改动，预同步之后仍需再做一次增量同步；
+                # 由于上一条命令的产物已在后台清理，这一步通常只剩逐文件 stat 比较。
+                self._await_pending_refresh()
                 self._refresh_workspace()
-            result = subprocess.run(  # noqa: S602
-                command,
-                shell=True,
-                cwd=str(self._workspace),
-                capture_output=True,
-                text=True,
-                timeout=self._timeout,
-                env=self._build_env(),
-                preexec_fn=self._preexec_limits,
-                check=False,
-            )
+            run = self._run_in_shell if self._persistent_shell else self._run_capped
+            returncode, stdout, stderr, overflowed = run(command)
         except subprocess.TimeoutExpired:
             return ExecuteResponse(
                 output=f"Error: Command timed out after {self._timeout:.1f} seconds.",
@@ -198,21 +603,26 @@ class SimpleSandboxBackend(FilesystemBackend, SandboxBackendProtocol):
             )
         except Exception as exc:  # noqa: BLE001
             return ExecuteResponse(output=f"Error executing command in sandbox: {exc}", exit_code=1, truncated=False)
-
-        output_parts: list[str] = []
-        if result.stdout:
-            output_parts.append(result.stdout)
-        if result.stderr:
-            stderr_lines = result.stderr.strip().split("\n")
-            output_parts.extend(f"[stderr] {line}" for line in stderr_lines if line)
-
-        output = "\n".join(output_parts).strip() or "<no output>"
-        truncated = False
-        if len(output) > self._max_output_bytes:
-            output = output[: self._max_output_bytes] + f"\n\n... Output truncated at {self._max_output_bytes} bytes."
-            truncated = True
-
-        if result.returncode != 0:
-            output = f"{output.rstrip()}\n\nExit code: {result.returncode}"
-
-        return ExecuteResponse(output=output, exit_code=result.returncode, truncated=truncated)
+        finally:
+            if self._refresh_each_execute:
+                self._schedule_refresh()
+
+        # 在字节层面拼装与截断，最后只解码一次；截断位置因此与提示中的字节数一致。
+        output_parts: list[bytes] = []
+        if stdout:
+            output_parts.append(stdout)
+        if stderr:
+            output_parts.extend([b"[stderr] " + line for line in stderr.strip().split(b"\n") if line])
+
+        raw_output = b"\n".join(output_parts).strip() or b"<no output>"
+        truncated = overflowed or len(raw_output) > self._max_output_bytes
+        if truncated:
+            raw_output = raw_output[: self._max_output_bytes]
+        output = raw_output.decode("utf-8", errors="replace")
+        if truncated:
+            output += f"\n\n... Output truncated at {self._max_output_bytes} bytes."
+
+        if returncode != 0:
+            output = f"{output.rstrip()}\n\nExit code: {returncode}"
+
+        return ExecuteResponse(output=output, exit_code=returncode, truncated=truncated)
@@ -1,18 +1,29 @@
-"""主循环辅助函数：状态展示与后台通知注入。"""
+"""主循环辅助函数：状态展示、`/cache` 命令与后台通知注入。"""
 
 from __future__ import annotations
 
+import functools
 from typing import Any
 
 
-def render_compact_status(compactor: Any) -> str:
-    """渲染上下文压缩配置状态。"""
+@functools.lru_cache(maxsize=4)
+def _format_compact_status(threshold: int, keep_recent: int, source_chars: int, transcript_dir: Any) -> str:
     return (
         "[compact] "
-        f"threshold={compactor.threshold} "
-        f"keep_recent={compactor.keep_recent_tool_results} "
-        f"source_chars={compactor.max_summary_source_chars} "
-        f"dir={compactor.transcript_dir}"
+        f"threshold={threshold} "
+        f"keep_recent={keep_recent} "
+        f"source_chars={source_chars} "
+        f"dir={transcript_dir}"
+    )
+
+
+def render_compact_status(compactor: Any) -> str:
+    """渲染上下文压缩配置状态（按配置快照缓存渲染结果）。"""
+    return _format_compact_status(
+        compactor.threshold,
+        compactor.keep_recent_tool_results,
+        compactor.max_summary_source_chars,
+        compactor.transcript_dir,
     )
 
 
@@ -28,12 +39,38 @@ def inject_background_notifications(history: list[dict[str, str]], background_ma
             f"[bg:{item['task_id']}] status={item['status']} command={item['command']} result={item['result']}"
         )
     notif_text = "\n".join(lines)
-    history.append(
-        {
-            "role": "user",
-            "content": f"<background-results>\n{notif_text}\n</background-results>",
-        }
+    history.extend(
+        (
+            {"role": "user", "content": f"<background-results>\n{notif_text}\n</background-results>"},
+            {"role": "assistant", "content": "Noted background results."},
+        )
     )
-    history.append({"role": "assistant", "content": "Noted background results."})
     return len(notifications)
 
+
+def handle_cache_command(command: str, cache: Any) -> None:
+    """处理 `/cache [status|clear|off|on]` 命令。
+
+    Args:
+        command: 已转为小写的完整命令文本。
+        cache: 运行时的 `LLMCache`；未通过 `MINICC_CACHE` 启用时为 `None`。
+
+    Returns:
+        None。函数直接打印处理结果。
+    """
+    parts = command.split()
+    action = parts[1] if len(parts) > 1 else "status"
+    if cache is None:
+        print("[cache] disabled. Set MINICC_CACHE=1 in .env to enable.")
+        return
+    if action == "clear":
+        cache.clear()
+        print("[cache] cleared.")
+    elif action in ("off", "on"):
+        cache.enabled = action == "on"
+        print(f"[cache] {action} for this session.")
+    elif action == "status":
+        state = "on" if cache.enabled else "off"
+        print(f"[cache] {state} | max_items={cache.max_items} ttl={cache.ttl_seconds}s path={cache.path or '(memory)'}")
+    else:
+        print("Usage: /cache [status|clear|off|on]")
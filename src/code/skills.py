@@ -1,48 +1,188 @@
 """Skill 发现、索引与命令处理。"""
 
+import json
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Final
+
+
+_FRONT_MATTER_DELIMITER = "---\n"
+_FRONT_MATTER_RE: Final[re.Pattern[str]] = re.compile(r"^---\s*\n(.*?)\n---\s*\n", re.DOTALL)
+_FRONT_MATTER_READ_BYTES = 4096
+_MAX_READ_WORKERS = 8
+_SKILL_NAME_TRANSLATION = str.maketrans("-", "_")
+_SKILLS_SNAPSHOT_VERSION = 4
+
+
+def _front_matter_block(text: str) -> str | None:
+    """截取 SKILL.md 开头 `---` 分隔的 front-matter 文本。
+
+    front-matter 固定位于文件开头，常见情况直接按分隔符切片，避免正则在正文上回溯；
+    CRLF 换行或分隔符带尾随空白时回退到预编译的 `_FRONT_MATTER_RE`。
+
+    Args:
+        text: SKILL.md 全文。
+
+    Returns:
+        两个分隔符之间的文本；不存在 front-matter 时返回 `None`。
+    """
+    if text.startswith(_FRONT_MATTER_DELIMITER):
+        end = text.find("\n" + _FRONT_MATTER_DELIMITER, len(_FRONT_MATTER_DELIMITER) - 1)
+        if end >= 0:
+            return text[len(_FRONT_MATTER_DELIMITER) : end]
+    if not text.startswith("---"):
+        return None
+    match = _FRONT_MATTER_RE.match(text)
+    return match.group(1) if match else None
+
+
+def _read_skill_text(md: Path) -> str | None:
+    """读取单个 SKILL.md 中足以解析 front-matter 的开头部分；读取失败时返回 `None`。
+
+    front-matter 位于文件开头且很短，先只读前 `_FRONT_MATTER_READ_BYTES` 字节；
+    仅当开头是 `---` 但在这段内找不到结束分隔符时，才继续读完整个文件。
+    """
+    try:
+        with md.open("rb") as f:
+            head = f.read(_FRONT_MATTER_READ_BYTES)
+            if len(head) == _FRONT_MATTER_READ_BYTES and head.startswith(b"---"):
+                if _front_matter_block(head.decode("utf-8", errors="replace")) is None:
+                    head += f.read()
+    except Exception:
+        return None
+    return head.decode("utf-8", errors="replace")
+
+
+def _parse_skill(md: Path, text: str | None) -> tuple[str, str]:
+    """从 SKILL.md 文本中解析 skill 名称与描述。
+
+    Args:
+        md: SKILL.md 路径，名称缺省时取其父目录名。
+        text: 文件内容；为 `None` 表示读取失败。
+
+    Returns:
+        `(name, description)` 二元组。
+    """
+    name = md.parent.name
+    description = ""
+    if text is None:
+        return name, description
+
+    try:
+        front_matter = _front_matter_block(text)
+        if front_matter is not None:
+            for line in front_matter.splitlines():
+                if ":" not in line:
+                    continue
+                key, value = line.split(":", 1)
+                key = key.strip()
+                value = value.strip().strip('"\'')
+                if key == "name" and value:
+                    name = value
+                if key == "description" and value:
+                    description = value
+    except Exception:
+        pass
+    return name, description
+
+
+def _skills_snapshot_path() -> Path:
+    """返回 skill 发现结果的磁盘快照路径。"""
+    return Path.home() / ".minicc" / "skills_snapshot.json"
+
+
+def _stat_skill_file(md: Path) -> list[int] | None:
+    """返回 SKILL.md 的 `[mtime_ns, size]`；stat 失败时返回 `None`（该文件不参与快照复用）。"""
+    try:
+        stat = md.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _load_skills_snapshot() -> dict[str, list]:
+    """读取快照条目 `path -> [mtime_ns, size, name, description]`；缺失或损坏时返回空字典。"""
+    try:
+        data = json.loads(_skills_snapshot_path().read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    if not isinstance(data, dict) or data.get("version") != _SKILLS_SNAPSHOT_VERSION:
+        return {}
+    entries = data.get("entries")
+    return entries if isinstance(entries, dict) else {}
+
+
+def _write_skills_snapshot(entries: dict[str, list]) -> None:
+    """原子写入快照；写入失败不影响本次发现结果。"""
+    path = _skills_snapshot_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"version": _SKILLS_SNAPSHOT_VERSION, "entries": entries}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
 
 
 def discover_skills(skills_dir: Path) -> dict[str, str]:
     """扫描 skills 目录并提取名称与描述。
 
     规则：读取每个 `*/SKILL.md` 的 front-matter，提取 `name` 和 `description`。
+    解析结果按文件记录在 `~/.minicc/skills_snapshot.json`：`(mtime_ns, size)` 未变化的文件直接复用
+    快照中的名称与描述，只有新增或改动的文件才会被读取（线程池并发 I/O）和解析。
 
     Args:
         skills_dir: skills 根目录路径。
 
     Returns:
-        `skill_name -> description` 映射。
+        按名称排序的 `skill_name -> description` 映射；展示与描述拼装直接按该顺序遍历。
     """
     skills: dict[str, str] = {}
     if not skills_dir.exists():
         return skills
 
-    for md in sorted(skills_dir.glob("*/SKILL.md")):
-        folder_name = md.parent.name
-        name = folder_name
-        description = ""
-
-        try:
-            text = md.read_text()
-            match = re.match(r"^---\s*\n(.*?)\n---\s*\n", text, re.DOTALL)
-            if match:
-                for line in match.group(1).splitlines():
-                    if ":" not in line:
-                        continue
-                    key, value = line.split(":", 1)
-                    key = key.strip()
-                    value = value.strip().strip('"\'')
-                    if key == "name" and value:
-                        name = value
-                    if key == "description" and value:
-                        description = value
-        except Exception:
-            pass
+    paths = sorted(skills_dir.glob("*/SKILL.md"))
+    if not paths:
+        return skills
 
+    cached_entries = _load_skills_snapshot()
+    entries: dict[str, list] = {}
+    parsed: dict[Path, tuple[str, str]] = {}
+    stale: list[tuple[Path, list[int] | None]] = []
+    for md in paths:
+        stat = _stat_skill_file(md)
+        entry = cached_entries.get(str(md))
+        if stat is not None and isinstance(entry, list) and len(entry) == 4 and entry[:2] == stat:
+            parsed[md] = (entry[2], entry[3])
+            entries[str(md)] = entry
+        else:
+            stale.append((md, stat))
+
+    if stale:
+        if len(stale) == 1:
+            # 只改动了一个文件（最常见的编辑场景）时直接读取，省去线程池的创建与回收。
+            texts = [_read_skill_text(stale[0][0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(_MAX_READ_WORKERS, len(stale))) as executor:
+                texts = list(executor.map(_read_skill_text, (md for md, _ in stale)))
+        for (md, stat), text in zip(stale, texts):
+            parsed[md] = _parse_skill(md, text)
+            # 使用读取前的 stat：若读取期间文件被改动，下次启动会因 stat 不匹配而重新解析。
+            if stat is not None and text is not None:
+                entries[str(md)] = [*stat, *parsed[md]]
+
+    for md in paths:
+        name, description = parsed[md]
         skills[name] = description
+    skills = dict(sorted(skills.items()))
 
+    if entries != cached_entries:
+        _write_skills_snapshot(entries)
     return skills
 
 
@@ -55,7 +195,7 @@ def normalize_skill_name(name: str) -> str:
     Returns:
         归一化后的名称（去首尾空格、小写、`-` 转 `_`）。
     """
-    return name.strip().lower().replace("-", "_")
+    return name.strip().lower().translate(_SKILL_NAME_TRANSLATION)
 
 
 def build_skill_aliases(skills: dict[str, str]) -> dict[str, str]:
@@ -69,9 +209,9 @@ def build_skill_aliases(skills: dict[str, str]) -> dict[str, str]:
     """
     aliases: dict[str, str] = {}
     for skill_name in skills:
-        aliases[skill_name] = skill_name
-        aliases[skill_name.lower()] = skill_name
-        aliases[normalize_skill_name(skill_name)] = skill_name
+        # 多数 skill 名三种写法相同，先去重再写入。
+        for alias in {skill_name, skill_name.lower(), normalize_skill_name(skill_name)}:
+            aliases[alias] = skill_name
     return aliases
 
 
@@ -79,13 +219,13 @@ def build_skill_descriptions(skills: dict[str, str]) -> str:
     """生成系统提示里使用的 skill 描述文本。
 
     Args:
-        skills: `skill_name -> description` 映射。
+        skills: `skill_name -> description` 映射，按其迭代顺序输出。
 
     Returns:
         多行文本，每行为一个 skill 的名称与描述。
     """
     return "\n".join(
-        f"- {name}: {desc or '(no description)'}" for name, desc in sorted(skills.items())
+        f"- {name}: {desc or '(no description)'}" for name, desc in skills.items()
     ) or "(no skills available)"
 
 
@@ -93,18 +233,24 @@ def print_skills(skills: dict[str, str], selected_skill: str | None) -> None:
     """打印 skill 列表并标记当前选择。
 
     Args:
-        skills: 可用 skill 映射。
+        skills: 可用 skill 映射，按其迭代顺序输出（`discover_skills` 已按名称排序，这里不再排序）。
         selected_skill: 当前选中的 skill。
 
     Returns:
         None。函数直接打印终端输出。
     """
-    print("\nSkills:")
-    for name, description in sorted(skills.items()):
-        marker = "*" if name == selected_skill else " "
-        print(f"{marker} {name}: {description or '(no description)'}")
+    lines = ["\nSkills:"]
+    lines.extend(
+        f"{'*' if name == selected_skill else ' '} {name}: {description or '(no description)'}"
+        for name, description in skills.items()
+    )
     if not skills:
-        print("(none)")
+        lines.append("(none)")
+    print("\n".join(lines))
+
+
+# `/skill` 与 `/subagent` 共用的子命令关键字到动作的映射；其余输入按名称解析。
+SELECTION_SUBCOMMANDS: Final[dict[str, str]] = {"list": "list", "ls": "list", "clear": "clear", "none": "clear"}
 
 
 def handle_skill_command(
@@ -133,12 +279,13 @@ def handle_skill_command(
         - `task_text`: 命令后附带的任务文本；没有则为 `None`。
         - `handled`: 是否已被命令消费。
     """
-    if len(parts) == 1 or parts[1].lower() in ("list", "ls"):
+    action = SELECTION_SUBCOMMANDS.get(parts[1].lower()) if len(parts) > 1 else "list"
+    if action == "list":
         print_skills(skills, selected_skill)
         print(render_active_selection(selected_skill, selected_subagent))
         return selected_skill, None, True
 
-    if parts[1].lower() in ("clear", "none"):
+    if action == "clear":
         selected_skill = None
         print("Skill selection cleared.")
         print(render_active_selection(selected_skill, selected_subagent))
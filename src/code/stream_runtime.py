@@ -1,11 +1,78 @@
 """消息渲染与工具调用流处理。"""
 
+import functools
 import json
+import random
+import sys
 import time
 from dataclasses import dataclass, field
-from typing import Any, Callable
+from typing import Any
 
-from src.code.todos import TodoRenderState, render_todos, todos_updates_from_messages
+from src.code.llm_cache import LLMCache
+from src.code.todos import (
+    TodoRenderState,
+    format_todos,
+    message_fields,
+    todos_from_fields,
+)
+
+
+_MAX_STREAM_ATTEMPTS = 4
+_BACKOFF_BASE_SECONDS = 0.3
+_BACKOFF_CAP_SECONDS = 8.0
+
+
+@functools.cache
+def _retryable_errors() -> tuple[type[BaseException], ...]:
+    """汇总可重试的瞬时错误类型：空/坏响应、限流、5xx、连接与超时。
+
+    SDK 异常类在首次需要时才导入，保持本模块导入开销低；依赖缺失时只重试 JSON 解析错误。
+    """
+    errors: list[type[BaseException]] = [json.JSONDecodeError]
+    try:
+        import anthropic
+
+        errors += [anthropic.APIConnectionError, anthropic.RateLimitError, anthropic.InternalServerError]
+    except Exception:
+        pass
+    try:
+        import httpx
+
+        errors += [httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError]
+    except Exception:
+        pass
+    return tuple(errors)
+
+
+@functools.cache
+def network_errors() -> tuple[type[BaseException], ...]:
+    """汇总网络连接失败与超时的异常类型，供主循环单独提示。
+
+    SDK 的连接/超时异常（`anthropic.APIConnectionError` 及其子类 `APITimeoutError`、
+    `httpx.TransportError`）并不继承内置的 `ConnectionError`/`TimeoutError`，需要显式列出。
+
+    Returns:
+        可直接用于 `except` 的异常类型元组。
+    """
+    errors: list[type[BaseException]] = [ConnectionError, TimeoutError]
+    try:
+        import anthropic
+
+        errors.append(anthropic.APIConnectionError)
+    except Exception:
+        pass
+    try:
+        import httpx
+
+        errors.append(httpx.TransportError)
+    except Exception:
+        pass
+    return tuple(errors)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """计算第 `attempt` 次失败后的等待时间（full jitter 指数退避）。"""
+    return random.uniform(0, min(_BACKOFF_CAP_SECONDS, _BACKOFF_BASE_SECONDS * 2**attempt))
 
 
 @dataclass
@@ -21,9 +88,16 @@ class ToolRenderState:
     printed_subagent_calls: set[str] = field(default_factory=set)
 
 
+# `id(content) -> (content, 段数, 归一化文本)`。保留 content 引用以防 id 被复用，
+# 段数用于识别原地追加；每次 `stream_with_retry` 结束时清空。
+_NORMALIZED_CACHE: dict[int, tuple[list, int, str]] = {}
+
+
 def normalize_content(content: object) -> str | None:
     """把消息内容归一化为字符串。
 
+    分段列表的拼接结果会按对象缓存，流式过程中同一条消息被重复渲染时不再重复遍历。
+
     Args:
         content: 可能是字符串，或 deepagents 的分段内容列表。
 
@@ -33,11 +107,16 @@ def normalize_content(content: object) -> str | None:
     if isinstance(content, str):
         return content
     if isinstance(content, list):
+        cached = _NORMALIZED_CACHE.get(id(content))
+        if cached is not None and cached[0] is content and cached[1] == len(content):
+            return cached[2]
         texts: list[str] = []
         for item in content:
             if isinstance(item, dict) and item.get("type") == "text":
                 texts.append(item.get("text", ""))
-        return "\n".join(text for text in texts if text)
+        text = "\n".join(text for text in texts if text)
+        _NORMALIZED_CACHE[id(content)] = (content, len(content), text)
+        return text
     return None
 
 
@@ -55,65 +134,82 @@ def extract_subagent_type(args: object) -> str | None:
     return args.get("subagent_type") or args.get("subagent") or args.get("sub_agent")
 
 
+def _write_lines(lines: list[str]) -> None:
+    """一次性写出并刷新缓冲的输出行，等价于逐行 `print`。"""
+    if not lines:
+        return
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def _collect_special_tool_calls(
+    tool_calls: list,
+    state: ToolRenderState,
+    subagent_skills: dict[str, list[str]],
+    out: list[str],
+) -> None:
+    """把单条消息中特殊工具调用（skill/task）的展示行追加到 `out`。"""
+    for call in tool_calls:
+        call_name = (call.get("name") or "").lower()
+        # 绝大多数调用既不是 skill 也不是 task，先按名称跳过，再取其余字段。
+        is_task = call_name == "task"
+        if not is_task and "skill" not in call_name:
+            continue
+        call_id = call.get("id")
+        args = call.get("args") if isinstance(call, dict) else None
+
+        if is_task:
+            if call_id and call_id in state.printed_subagent_calls:
+                continue
+            subagent = extract_subagent_type(args)
+            skills = subagent_skills.get(subagent, [])
+            out.append(f"\n[task] subagent: {subagent or 'unknown'} | skills: {', '.join(skills) or '(none)'}")
+            if call_id:
+                state.printed_subagent_calls.add(call_id)
+        else:
+            if call_id and call_id in state.printed_skill_calls:
+                continue
+            skill_name = args.get("name") if isinstance(args, dict) else None
+            out.append(f"\n[skill] name: {skill_name or 'unknown'}")
+            if call_id:
+                state.printed_skill_calls.add(call_id)
+
+
 def render_special_tool_calls(
     messages: list,
-    start_index: int,
     state: ToolRenderState,
     subagent_skills: dict[str, list[str]],
 ) -> None:
     """渲染特殊工具调用（skill/task）信息。
 
     Args:
-        messages: 当前消息列表。
-        start_index: 仅从该下标之后开始扫描。
+        messages: 待扫描的新增消息。
         state: 渲染去重状态。
         subagent_skills: subagent 与技能名列表映射，用于打印提示。
 
     Returns:
         None。函数直接打印终端输出。
     """
-    for message in messages[start_index:]:
-        tool_calls = getattr(message, "tool_calls", None)
-        if tool_calls is None and isinstance(message, dict):
-            tool_calls = message.get("tool_calls")
-        if not tool_calls:
-            continue
-
-        for call in tool_calls:
-            call_name = (call.get("name") or "").lower()
-            call_id = call.get("id")
-            args = call.get("args") if isinstance(call, dict) else None
-
-            if "skill" in call_name:
-                if call_id and call_id in state.printed_skill_calls:
-                    continue
-                skill_name = args.get("name") if isinstance(args, dict) else None
-                print(f"\n[skill] name: {skill_name or 'unknown'}")
-                if call_id:
-                    state.printed_skill_calls.add(call_id)
-
-            if call_name == "task":
-                if call_id and call_id in state.printed_subagent_calls:
-                    continue
-                subagent = extract_subagent_type(args)
-                skills = subagent_skills.get(subagent, [])
-                print(f"\n[task] subagent: {subagent or 'unknown'} | skills: {', '.join(skills) or '(none)'}")
-                if call_id:
-                    state.printed_subagent_calls.add(call_id)
+    out: list[str] = []
+    for message in messages:
+        _, tool_calls = message_fields(message)
+        if tool_calls:
+            _collect_special_tool_calls(tool_calls, state, subagent_skills, out)
+    _write_lines(out)
 
 
 def print_turn(
     messages: list,
-    start_index: int,
     todo_state: TodoRenderState,
     tool_state: ToolRenderState,
     subagent_skills: dict[str, list[str]],
 ) -> None:
-    """打印本轮新增消息，并渲染 todo 与关键工具调用。
+    """打印一批新增消息，并渲染 todo 与关键工具调用。
+
+    所有输出先缓冲到行列表，最后一次性写入 stdout，避免逐行 `print` 的锁与系统调用开销。
 
     Args:
-        messages: 完整消息列表。
-        start_index: 本轮新增消息起始下标。
+        messages: 本次需要渲染的新增消息（已由调用方切好片）。
         todo_state: todo 渲染状态容器。
         tool_state: 工具调用渲染状态容器。
         subagent_skills: subagent 到技能列表映射。
@@ -125,92 +221,165 @@ def print_turn(
         print(messages)
         return
 
-    updates = todos_updates_from_messages(messages, start_index)
-    updates_by_index: dict[int, list[list[dict[str, Any]]]] = {}
-    for idx, todos in updates:
-        updates_by_index.setdefault(idx, []).append(todos)
-
-    for idx, message in enumerate(messages):
-        if idx < start_index:
-            continue
-        content = getattr(message, "content", None)
-        if content is None and isinstance(message, dict):
-            content = message.get("content")
+    # 单次遍历：每条消息只探测一次字段，同时产出文本、todo 与工具调用展示行；
+    # 工具调用行单独缓冲，保持原先“全部文本/todo 之后再打印工具调用”的顺序。
+    out: list[str] = []
+    tool_out: list[str] = []
+    for message in messages:
+        content, tool_calls = message_fields(message)
         text = normalize_content(content)
         if text:
-            print(text)
-        for todos in updates_by_index.get(idx, []):
+            out.append(text)
+        for todos in todos_from_fields(content, tool_calls, todo_state.parsed_payloads):
             if todos == todo_state.last_todos:
                 continue
             todo_state.last_todos = todos
-            render_todos(todos)
+            out.extend(format_todos(todos))
+        if tool_calls:
+            _collect_special_tool_calls(tool_calls, tool_state, subagent_skills, tool_out)
+
+    out.extend(tool_out)
+    _write_lines(out)
 
-    render_special_tool_calls(messages, start_index, tool_state, subagent_skills)
+
+@dataclass
+class TurnPrinter:
+    """流式输出的增量打印器。
+
+    记录本轮已打印到的位置，每个 chunk 只把尚未打印的尾部消息交给渲染函数，
+    单个 chunk 的渲染开销与新增消息数成正比，而不是与整段消息列表成正比。
+
+    Attributes:
+        todo_state: todo 渲染状态容器（跨轮保留，用于避免重复打印相同 todo）。
+        subagent_skills: subagent 到技能列表映射。
+        tool_state: 工具调用渲染去重状态，仅在一轮内有效。
+        start_index: 本轮第一条新消息的下标。
+        printed_index: 下一条待打印消息的下标。
+    """
+
+    todo_state: TodoRenderState
+    subagent_skills: dict[str, list[str]]
+    tool_state: ToolRenderState = field(default_factory=ToolRenderState)
+    start_index: int = 0
+    printed_index: int = 0
+
+    def begin(self, start_index: int) -> None:
+        """开始新一轮（或一次重试）打印。
+
+        工具调用 ID 只需在单轮流式输出内去重，每轮换一份新的去重集合，
+        内存占用随本轮调用数而不是会话总调用数增长。
+        """
+        self.start_index = start_index
+        self.printed_index = start_index
+        self.tool_state = ToolRenderState()
+
+    def feed(self, messages: list) -> None:
+        """渲染 `messages` 中尚未打印的部分。"""
+        if len(messages) <= self.printed_index:
+            return
+        print_turn(messages[self.printed_index :], self.todo_state, self.tool_state, self.subagent_skills)
+        self.printed_index = len(messages)
+
+    def refresh_last(self, messages: list) -> None:
+        """流结束后重新渲染最后一条消息。
+
+        `stream_mode="values"` 下最后一条消息可能被原地更新而消息数不变，
+        这里补渲染一次，避免只展示早期的片段。
+        """
+        if not messages or len(messages) != self.printed_index:
+            return
+        refresh_index = max(self.start_index, len(messages) - 1)
+        if refresh_index < len(messages):
+            print_turn(messages[refresh_index:], self.todo_state, self.tool_state, self.subagent_skills)
 
 
 def stream_with_retry(
     agent: Any,
-    history: list[dict[str, str]],
-    start_index: int,
+    history: list[Any],
     recursion_limit: int,
-    on_messages: Callable[[list, int], None],
+    printer: TurnPrinter,
+    cache: LLMCache | None = None,
+    max_concurrency: int | None = None,
 ) -> list[Any]:
-    """以流式方式调用 agent，并对 JSON 解析错误做一次重试。
+    """以流式方式调用 agent，瞬时错误时按指数退避重试。
+
+    JSON 解析失败、限流、5xx、连接/超时错误最多重试到 `_MAX_STREAM_ATTEMPTS` 次，
+    每次等待 `[0, min(cap, base * 2**attempt)]` 的随机时长，避免并发客户端同步重试。
+    重试会从头重新执行整轮，因此只在尚未收到任何新消息时进行：一旦流中出现了 history 之外的消息，
+    工具调用（shell、写文件、任务更新等）就可能已经执行，此时直接抛出，避免副作用重复发生。
 
     Args:
         agent: deepagents agent 实例。
-        history: 会话消息历史。
-        start_index: 本轮开始打印的消息下标。
+        history: 会话消息历史（LangChain 消息对象为主，按原样传给 agent）；其长度即本轮开始打印的消息下标。
         recursion_limit: agent 流调用时的递归限制。
-        on_messages: 每次有新增消息时触发的回调。
+        printer: 增量打印器，每个 chunk 只渲染新增消息。
+        cache: 可选响应缓存；命中时直接回放缓存的新增消息，不再调用 agent。
+        max_concurrency: 同一步内并行执行的工具调用上限；`None` 表示沿用 LangGraph 默认线程池大小。
 
     Returns:
         最终完整消息列表（用于回写到 `history`）。
 
     Raises:
-        json.JSONDecodeError: 两次尝试仍解析失败时抛出。
+        json.JSONDecodeError: 重试次数用尽后仍解析失败，或本轮已产生新消息后解析失败时抛出
+            （其他可重试错误同理原样抛出）。
         RuntimeError: 未取得有效结果时抛出。
     """
+    cache_key = cache.key_for(history) if cache is not None else None
+    if cache_key is not None:
+        cached_tail = cache.get(cache_key)
+        if cached_tail is not None:
+            print("[cache] replaying cached response.")
+            final_messages = [*history, *cached_tail]
+            try:
+                printer.begin(len(history))
+                printer.feed(final_messages)
+            finally:
+                _NORMALIZED_CACHE.clear()
+            return final_messages
+
+    config: dict[str, Any] = {"recursion_limit": recursion_limit}
+    if max_concurrency is not None:
+        config["max_concurrency"] = max_concurrency
     last_error: Exception | None = None
 
-    for attempt in range(2):
+    for attempt in range(_MAX_STREAM_ATTEMPTS):
+        progressed = False
         try:
-            printed_index = start_index
+            printer.begin(len(history))
             final_messages: list[Any] = history
 
             # 流式调用agent执行
             for chunk in agent.stream(
                 {"messages": history},
-                {"recursion_limit": recursion_limit},
+                config,
                 stream_mode="values",
             ):
-                if not isinstance(chunk, dict):
+                # `stream_mode="values"` 下 chunk 是状态字典，直接取字段，异常形态再跳过。
+                try:
+                    messages = chunk["messages"]
+                except (TypeError, KeyError, IndexError):
                     continue
-                messages = chunk.get("messages")
                 if not isinstance(messages, list):
                     continue
-                
-                if len(messages) > printed_index:
-                    on_messages(messages, printed_index)
-                    printed_index = len(messages)
 
+                if len(messages) > len(history):
+                    progressed = True
+                printer.feed(messages)
                 final_messages = messages
 
-            # In `stream_mode="values"`, the last message can be updated in-place
-            # without increasing message count. Refresh the last message once after
-            # stream ends to avoid showing only an early partial fragment.
-            if final_messages and len(final_messages) == printed_index:
-                refresh_index = max(start_index, len(final_messages) - 1)
-                if refresh_index < len(final_messages):
-                    on_messages(final_messages, refresh_index)
+            printer.refresh_last(final_messages)
 
+            if cache_key is not None and len(final_messages) > len(history):
+                cache.set(cache_key, final_messages[len(history) :])
             last_error = None
             return final_messages
-        except json.JSONDecodeError as exc:
+        except _retryable_errors() as exc:
             last_error = exc
-            if attempt == 0:
-                time.sleep(0.6)
+            if not progressed and attempt + 1 < _MAX_STREAM_ATTEMPTS:
+                time.sleep(_backoff_delay(attempt))
                 continue
             raise
+        finally:
+            _NORMALIZED_CACHE.clear()
 
     raise last_error or RuntimeError("Empty result from agent stream")
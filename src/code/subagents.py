@@ -1,28 +1,35 @@
 """Subagent 配置与命令处理。"""
 
-from typing import Any
-
-
-DEFAULT_SUBAGENTS = [
-    {
-        "name": "frontend-engineer",
-        "description": "前端工程师，负责 React/Vue 组件开发、CSS 样式优化、前端性能调优",
-        "prompt": "You are a frontend engineer. Focus on component structure, style quality, and frontend performance.",
-    },
-    {
-        "name": "backend-engineer",
-        "description": "后端工程师，负责 API 设计、数据层与服务端性能优化",
-        "prompt": "You are a backend engineer. Focus on API contracts, data modeling, reliability, and performance.",
-    },
-    {
-        "name": "test-engineer",
-        "description": "测试工程师，负责测试用例设计、自动化与质量保障",
-        "prompt": "You are a test engineer. Focus on test strategy, automation, and regression protection.",
-    },
-]
-
-
-def to_deepagents_subagents(subagents: list[dict[str, Any]]) -> list[dict[str, Any]]:
+from types import MappingProxyType
+from typing import Any, Mapping, Sequence
+
+from src.code.skills import SELECTION_SUBCOMMANDS
+
+
+# 只读配置：外层为 tuple，每项为 `MappingProxyType`，防止运行期被意外修改。
+DEFAULT_SUBAGENTS: tuple[Mapping[str, Any], ...] = tuple(
+    MappingProxyType(item)
+    for item in (
+        {
+            "name": "frontend-engineer",
+            "description": "前端工程师，负责 React/Vue 组件开发、CSS 样式优化、前端性能调优",
+            "prompt": "You are a frontend engineer. Focus on component structure, style quality, and frontend performance.",
+        },
+        {
+            "name": "backend-engineer",
+            "description": "后端工程师，负责 API 设计、数据层与服务端性能优化",
+            "prompt": "You are a backend engineer. Focus on API contracts, data modeling, reliability, and performance.",
+        },
+        {
+            "name": "test-engineer",
+            "description": "测试工程师，负责测试用例设计、自动化与质量保障",
+            "prompt": "You are a test engineer. Focus on test strategy, automation, and regression protection.",
+        },
+    )
+)
+
+
+def to_deepagents_subagents(subagents: Sequence[Mapping[str, Any]]) -> list[dict[str, Any]]:
     """把本地 subagent 配置转换为 deepagents 需要的字段格式。
 
     主要规则：若存在 `prompt` 且不存在 `system_prompt`，则重命名为 `system_prompt`。
@@ -42,7 +49,7 @@ def to_deepagents_subagents(subagents: list[dict[str, Any]]) -> list[dict[str, A
     return mapped
 
 
-def build_subagent_by_name(subagents: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+def build_subagent_by_name(subagents: Sequence[Mapping[str, Any]]) -> dict[str, Mapping[str, Any]]:
     """按名称构建 subagent 快速索引。
 
     Args:
@@ -54,7 +61,7 @@ def build_subagent_by_name(subagents: list[dict[str, Any]]) -> dict[str, dict[st
     return {item["name"]: item for item in subagents}
 
 
-def build_subagent_descriptions(subagents: list[dict[str, Any]]) -> str:
+def build_subagent_descriptions(subagents: Sequence[Mapping[str, Any]]) -> str:
     """生成系统提示里使用的 subagent 描述文本。
 
     Args:
@@ -63,10 +70,10 @@ def build_subagent_descriptions(subagents: list[dict[str, Any]]) -> str:
     Returns:
         多行文本，每行为一个 subagent 的名称与描述。
     """
-    return "\n".join(f"- {item['name']}: {item['description']}" for item in subagents)
+    return "\n".join(f"- {item['name']}: {item['description']}" for item in subagents) or "(no subagents available)"
 
 
-def print_subagents(subagent_by_name: dict[str, dict[str, Any]], selected_subagent: str | None) -> None:
+def print_subagents(subagent_by_name: dict[str, Mapping[str, Any]], selected_subagent: str | None) -> None:
     """打印 subagent 列表并标记当前选择。
 
     Args:
@@ -76,19 +83,21 @@ def print_subagents(subagent_by_name: dict[str, dict[str, Any]], selected_subage
     Returns:
         None。函数直接打印终端输出。
     """
-    print("\nSubagents:")
-    for name, item in subagent_by_name.items():
-        marker = "*" if name == selected_subagent else " "
-        print(f"{marker} {name}: {item['description']}")
+    lines = ["\nSubagents:"]
+    lines.extend(
+        f"{'*' if name == selected_subagent else ' '} {name}: {item['description']}"
+        for name, item in subagent_by_name.items()
+    )
     if not subagent_by_name:
-        print("(none)")
+        lines.append("(none)")
+    print("\n".join(lines))
 
 
 def handle_subagent_command(
     parts: list[str],
     selected_skill: str | None,
     selected_subagent: str | None,
-    subagent_by_name: dict[str, dict[str, Any]],
+    subagent_by_name: dict[str, Mapping[str, Any]],
     render_active_selection,
 ) -> tuple[str | None, str | None, bool]:
     """处理 `/subagent` 命令。
@@ -108,12 +117,13 @@ def handle_subagent_command(
         - `task_text`: 若命令后带任务文本则返回，否则为 `None`。
         - `handled`: 是否已被命令消费。
     """
-    if len(parts) == 1 or parts[1].lower() in ("list", "ls"):
+    action = SELECTION_SUBCOMMANDS.get(parts[1].lower()) if len(parts) > 1 else "list"
+    if action == "list":
         print_subagents(subagent_by_name, selected_subagent)
         print(render_active_selection(selected_skill, selected_subagent))
         return selected_subagent, None, True
 
-    if parts[1].lower() in ("clear", "none"):
+    if action == "clear":
         selected_subagent = None
         print("Subagent selection cleared.")
         print(render_active_selection(selected_skill, selected_subagent))
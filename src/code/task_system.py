@@ -2,115 +2,254 @@
 
 from __future__ import annotations
 
+import bisect
+import functools
 import json
+import os
+import secrets
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
 
 VALID_STATUS = {"pending", "in_progress", "completed"}
+# 带参数的 `json.dumps` 每次都会新建编码器；未安装 orjson 时任务写盘与工具输出共用同一个实例。
+_ENCODER = json.JSONEncoder(ensure_ascii=False, indent=2)
+
+
+def _loads(data: bytes) -> Any:
+    """解析任务文件内容；优先使用 orjson。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(data: Any) -> bytes:
+    """把任务序列化为 UTF-8 JSON 字节串；优先使用 orjson。"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return _ENCODER.encode(data).encode("utf-8")
+
+
+def _locked(method):
+    """让 `TaskManager` 的公开方法持有实例锁执行。
+
+    LangGraph 在线程池中并发执行同步工具，内存索引、待写集合与写盘都不是线程安全的。
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: TaskManager, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 @dataclass
 class TaskManager:
-    """基于文件的任务图管理器。"""
+    """基于文件的任务图管理器。
+
+    启动时把 `task_*.json` 一次性读入内存索引 `_tasks`，之后所有读取都走内存，
+    每次变更只重写实际改动的任务文件。本实例是任务目录的唯一写入方，
+    运行期间直接在磁盘上修改的任务文件不会被重新读取。公开方法返回任务的副本。
+    """
 
     tasks_dir: Path
 
     def __post_init__(self) -> None:
         self.tasks_dir.mkdir(parents=True, exist_ok=True)
-        self._next_id = self._max_id() + 1
+        task_files = self._task_files()
+        self._tasks: dict[int, dict[str, Any]] = self._read_all(task_files)
+        # 反向引用索引：`_referrers[kind][x]` 是 `kind` 列表中包含 x 的任务 ID 集合；
+        # `_indexed_edges` 记录每个任务上次建索引时的边，用于增量维护。
+        self._referrers: dict[str, dict[int, set[int]]] = {"blockedBy": {}, "blocks": {}}
+        self._indexed_edges: dict[int, dict[str, frozenset[int]]] = {}
+        for task_id, task in self._tasks.items():
+            self._index_edges(task_id, task)
+        self._dirty: set[int] = set()
+        self._next_id = max(task_files, default=0) + 1
+        self._lock = threading.Lock()
 
     def _task_path(self, task_id: int) -> Path:
         return self.tasks_dir / f"task_{task_id}.json"
 
-    def _max_id(self) -> int:
-        max_id = 0
-        for file in self.tasks_dir.glob("task_*.json"):
-            suffix = file.stem.split("_", 1)[-1]
-            if suffix.isdigit():
-                max_id = max(max_id, int(suffix))
-        return max_id
+    def _task_files(self) -> dict[int, str]:
+        """一次 `os.scandir` 列出 `task_<id>.json`，返回 `id -> 路径`。
+
+        直接按文件名切片解析 ID，不构造 `Path` 对象；下一个 ID 也由这里的文件名决定，
+        因此无法解析的任务文件同样会占用其 ID。
+        """
+        files: dict[int, str] = {}
+        with os.scandir(self.tasks_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith("task_") and name.endswith(".json") and name[5:-5].isdigit():
+                    files[int(name[5:-5])] = entry.path
+        return files
+
+    @staticmethod
+    def _read_all(task_files: dict[int, str]) -> dict[int, dict[str, Any]]:
+        """读取全部任务文件；无法解析的文件跳过。"""
+        tasks: dict[int, dict[str, Any]] = {}
+        for path in task_files.values():
+            try:
+                with open(path, "rb") as file:
+                    task = _loads(file.read())
+                tasks[int(task["id"])] = task
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return tasks
+
+    def _index_edges(self, task_id: int, task: dict[str, Any]) -> None:
+        """按任务当前的边增量更新反向引用索引。"""
+        previous = self._indexed_edges.get(task_id, {})
+        current: dict[str, frozenset[int]] = {}
+        for kind, referrers in self._referrers.items():
+            edges = frozenset(int(v) for v in task.get(kind, []))
+            old_edges = previous.get(kind, frozenset())
+            for target in old_edges - edges:
+                referrers[target].discard(task_id)
+            for target in edges - old_edges:
+                referrers.setdefault(target, set()).add(task_id)
+            current[kind] = edges
+        self._indexed_edges[task_id] = current
 
     def _save(self, task: dict[str, Any]) -> None:
-        self._task_path(int(task["id"])).write_text(
-            json.dumps(task, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        """更新内存索引并把任务标记为待写盘；由公开方法结束前的 `_flush` 统一写出。"""
+        task_id = int(task["id"])
+        self._tasks[task_id] = task
+        self._index_edges(task_id, task)
+        self._dirty.add(task_id)
+
+    def _flush(self) -> None:
+        """把本次操作改动过的任务各写一次盘（临时文件 + `os.replace`，写入是原子的）。
+
+        同一任务在一次 `create`/`update` 中可能被多次修改，但只序列化、写入一次。
+        """
+        dirty, self._dirty = self._dirty, set()
+        for task_id in sorted(dirty):
+            path = self._task_path(task_id)
+            # 临时文件名唯一，写入或替换失败时删除，不留下残片；按 0666 创建，
+            # 权限由进程 umask 决定，与普通 `open` 写出的文件一致。
+            tmp_path = self.tasks_dir / f".{path.name}.{secrets.token_hex(4)}.tmp"
+            fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    file.write(_dumps(self._tasks[task_id]))
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
 
     def _load(self, task_id: int) -> dict[str, Any]:
-        path = self._task_path(task_id)
-        if not path.exists():
+        task = self._tasks.get(task_id)
+        if task is None:
             raise ValueError(f"Task {task_id} not found")
-        return json.loads(path.read_text(encoding="utf-8"))
+        return task
 
-    def _iter_tasks(self) -> list[dict[str, Any]]:
-        tasks: list[dict[str, Any]] = []
-        for file in sorted(self.tasks_dir.glob("task_*.json")):
-            tasks.append(json.loads(file.read_text(encoding="utf-8")))
-        tasks.sort(key=lambda item: int(item.get("id", 0)))
-        return tasks
+    @staticmethod
+    def _snapshot(task: dict[str, Any]) -> dict[str, Any]:
+        """返回任务的副本，避免调用方改动内存索引。"""
+        return {**task, "blockedBy": list(task.get("blockedBy", [])), "blocks": list(task.get("blocks", []))}
 
-    def _ensure_task_exists(self, task_id: int) -> None:
-        if not self._task_path(task_id).exists():
-            raise ValueError(f"Task {task_id} not found")
+    def _iter_tasks(self) -> list[dict[str, Any]]:
+        return [self._tasks[task_id] for task_id in sorted(self._tasks)]
 
     def _normalize_ids(self, values: list[int] | None) -> list[int]:
+        """去重并排序任务 ID；与内存索引做一次集合差校验存在性。"""
         if not values:
             return []
-        unique_ids = sorted({int(v) for v in values})
-        for task_id in unique_ids:
-            self._ensure_task_exists(task_id)
-        return unique_ids
+        unique_ids = {int(v) for v in values}
+        missing = unique_ids - self._tasks.keys()
+        if missing:
+            raise ValueError(f"Task {min(missing)} not found")
+        return sorted(unique_ids)
 
     def _clear_dependency(self, completed_id: int) -> None:
-        for task in self._iter_tasks():
-            blocked_by = task.get("blockedBy", [])
-            if completed_id in blocked_by:
-                task["blockedBy"] = [item for item in blocked_by if item != completed_id]
-                self._save(task)
+        """从依赖已完成任务的 `blockedBy` 中移除它；只访问反向引用索引给出的任务。"""
+        # `_save` 会更新索引，先复制一份再遍历。
+        for dependent_id in sorted(self._referrers["blockedBy"].get(completed_id, ())):
+            task = self._tasks[dependent_id]
+            task["blockedBy"] = [item for item in task.get("blockedBy", []) if item != completed_id]
+            self._save(task)
+
+    def _check_acyclic(self, task_id: int, blocked_by: list[int], blocks: list[int]) -> None:
+        """确认写入这组边后依赖图仍然无环，否则抛出 `ValueError`。
+
+        写入后本任务的前驱恰为 `blocked_by`、后继恰为 `blocks`（反向边同步会改写其余任务里
+        涉及本任务的边），因此只需从 `blocked_by` 沿其余任务的 `blockedBy` 向上搜索，
+        看能否到达 `blocks` 中的任务；搜索范围是新前驱的祖先，而不是整张图。
+        """
+        successors = set(blocks)
+        successors.discard(task_id)
+        if not successors or not blocked_by:
+            return
+        pending = [value for value in blocked_by if value != task_id]
+        seen = set(pending)
+        while pending:
+            current = pending.pop()
+            if current in successors:
+                raise ValueError(f"Dependency cycle: task {current} cannot both block and depend on task {task_id}")
+            edges = self._indexed_edges.get(current)
+            if edges is None:
+                continue
+            for predecessor in edges["blockedBy"]:
+                if predecessor != task_id and predecessor not in seen:
+                    seen.add(predecessor)
+                    pending.append(predecessor)
 
     def _sync_reverse_edges(self, task_id: int, blocked_by: list[int], blocks: list[int]) -> None:
-        all_tasks = {int(task["id"]): task for task in self._iter_tasks()}
-        if task_id not in all_tasks:
+        """写入任务的边，并只为边集发生变化的相关任务同步反向边。
+
+        需要触及的只有新旧 `blockedBy`/`blocks` 的并集，以及列表中引用了本任务的任务
+        （由反向引用索引给出，覆盖依赖被 `_clear_dependency` 清除后只剩单向边的情况）；
+        其余任务与本任务之间没有任何边，不必遍历。
+        """
+        current = self._tasks.get(task_id)
+        if current is None:
             return
 
-        current = all_tasks[task_id]
+        # `_indexed_edges` 与任务列表同步维护且已转成 int 集合，直接复用，不再逐次重建集合。
+        old_edges = self._indexed_edges[task_id]
+        new_blocked_by = set(blocked_by)
+        new_blocks = set(blocks)
+
         current["blockedBy"] = blocked_by
         current["blocks"] = blocks
         self._save(current)
 
-        for other_id, other_task in all_tasks.items():
-            if other_id == task_id:
+        affected = new_blocked_by | new_blocks | old_edges["blockedBy"] | old_edges["blocks"]
+        affected |= self._referrers["blockedBy"].get(task_id, set())
+        affected |= self._referrers["blocks"].get(task_id, set())
+        affected.discard(task_id)
+        for other_id in sorted(affected):
+            other_task = self._tasks.get(other_id)
+            if other_task is None:
                 continue
 
-            other_blocked_by = [int(v) for v in other_task.get("blockedBy", [])]
-            other_blocks = [int(v) for v in other_task.get("blocks", [])]
-            changed = False
-
-            should_block_other = other_id in blocks
-            has_block_other = task_id in other_task.get("blockedBy", [])
-            if should_block_other and not has_block_other:
-                other_blocked_by.append(task_id)
-                changed = True
-            if not should_block_other and has_block_other:
-                other_blocked_by = [v for v in other_blocked_by if v != task_id]
-                changed = True
-
-            should_be_blocked_by_other = other_id in blocked_by
-            has_reverse_block = task_id in other_task.get("blocks", [])
-            if should_be_blocked_by_other and not has_reverse_block:
-                other_blocks.append(task_id)
-                changed = True
-            if not should_be_blocked_by_other and has_reverse_block:
-                other_blocks = [v for v in other_blocks if v != task_id]
-                changed = True
-
-            if changed:
-                other_task["blockedBy"] = sorted(set(other_blocked_by))
-                other_task["blocks"] = sorted(set(other_blocks))
-                self._save(other_task)
+            other_edges = self._indexed_edges[other_id]
+            toggle_blocked_by = (other_id in new_blocks) != (task_id in other_edges["blockedBy"])
+            toggle_blocks = (other_id in new_blocked_by) != (task_id in other_edges["blocks"])
+            if not (toggle_blocked_by or toggle_blocks):
+                continue
 
+            # 每个相关任务的每张边表至多增删本任务一个 ID，在已排序列表上二分增删，不必整体重排。
+            if toggle_blocked_by:
+                other_task["blockedBy"] = _toggled(other_task.get("blockedBy", []), task_id)
+            if toggle_blocks:
+                other_task["blocks"] = _toggled(other_task.get("blocks", []), task_id)
+            self._save(other_task)
+
+    @_locked
     def create(
         self,
         subject: str,
@@ -137,11 +276,18 @@ class TaskManager:
         }
         self._save(task)
 
-        normalized_blocked_by = self._normalize_ids(blocked_by)
-        normalized_blocks = self._normalize_ids(blocks)
-        self._sync_reverse_edges(task_id, normalized_blocked_by, normalized_blocks)
-        return self._load(task_id)
-
+        # 依赖 ID 校验失败时任务本身仍然已创建，因此无论成败都要写盘。
+        try:
+            # 与 `update` 一致，忽略指向自身的依赖。
+            normalized_blocked_by = [v for v in self._normalize_ids(blocked_by) if v != task_id]
+            normalized_blocks = [v for v in self._normalize_ids(blocks) if v != task_id]
+            self._check_acyclic(task_id, normalized_blocked_by, normalized_blocks)
+            self._sync_reverse_edges(task_id, normalized_blocked_by, normalized_blocks)
+        finally:
+            self._flush()
+        return self._snapshot(self._load(task_id))
+
+    @_locked
     def update(
         self,
         task_id: int,
@@ -175,7 +321,21 @@ class TaskManager:
         for value in (remove_blocks or []):
             blocks.discard(int(value))
 
-        self._sync_reverse_edges(task_id, sorted(blocked_by), sorted(blocks))
+        sorted_blocked_by = sorted(blocked_by)
+        sorted_blocks = sorted(blocks)
+        # 只改状态/负责人时边不变；若反向引用也与本任务的边一致，同步必然是空操作，直接跳过。
+        # 不一致（例如依赖完成后只剩单向边）时仍需同步来修复另一侧。
+        edges_in_sync = (
+            current.get("blockedBy") == sorted_blocked_by
+            and current.get("blocks") == sorted_blocks
+            and self._referrers["blocks"].get(task_id, set()) == blocked_by
+            and self._referrers["blockedBy"].get(task_id, set()) == blocks
+        )
+        if not edges_in_sync:
+            # 完成的任务会在下方 `_clear_dependency` 中解除对下游的阻塞，不会留在环上。
+            if (normalized_status or current.get("status")) != "completed":
+                self._check_acyclic(task_id, sorted_blocked_by, sorted_blocks)
+            self._sync_reverse_edges(task_id, sorted_blocked_by, sorted_blocks)
         task = self._load(task_id)
 
         if normalized_status is not None:
@@ -188,11 +348,14 @@ class TaskManager:
             self._clear_dependency(task_id)
             task = self._load(task_id)
 
-        return task
+        self._flush()
+        return self._snapshot(task)
 
+    @_locked
     def get(self, task_id: int) -> dict[str, Any]:
-        return self._load(task_id)
+        return self._snapshot(self._load(task_id))
 
+    @_locked
     def claim_task(self, task_id: int, owner: str) -> dict[str, Any]:
         owner_name = (owner or "").strip()
         if not owner_name:
@@ -209,8 +372,10 @@ class TaskManager:
         task["owner"] = owner_name
         task["status"] = "in_progress"
         self._save(task)
-        return task
+        self._flush()
+        return self._snapshot(task)
 
+    @_locked
     def bind_worktree(self, task_id: int, worktree: str) -> dict[str, Any]:
         worktree_name = (worktree or "").strip()
         if not worktree_name:
@@ -221,20 +386,33 @@ class TaskManager:
         if task.get("status") == "pending":
             task["status"] = "in_progress"
         self._save(task)
-        return task
+        self._flush()
+        return self._snapshot(task)
 
+    @_locked
     def unbind_worktree(self, task_id: int) -> dict[str, Any]:
         task = self._load(task_id)
         task["worktree"] = ""
         self._save(task)
-        return task
+        self._flush()
+        return self._snapshot(task)
 
+    @_locked
     def list_all(self) -> dict[str, Any]:
-        tasks = self._iter_tasks()
-        ready = [t for t in tasks if t.get("status") == "pending" and not t.get("blockedBy")]
-        blocked = [t for t in tasks if t.get("status") == "pending" and t.get("blockedBy")]
-        in_progress = [t for t in tasks if t.get("status") == "in_progress"]
-        completed = [t for t in tasks if t.get("status") == "completed"]
+        tasks = [self._snapshot(task) for task in self._iter_tasks()]
+        ready: list[dict[str, Any]] = []
+        blocked: list[dict[str, Any]] = []
+        in_progress: list[dict[str, Any]] = []
+        completed: list[dict[str, Any]] = []
+        # 单次遍历分桶，与分别过滤四次的结果（含各桶内顺序）一致。
+        for task in tasks:
+            status = task.get("status")
+            if status == "pending":
+                (blocked if task["blockedBy"] else ready).append(task)
+            elif status == "in_progress":
+                in_progress.append(task)
+            elif status == "completed":
+                completed.append(task)
         return {
             "tasks": tasks,
             "ready": ready,
@@ -245,8 +423,19 @@ class TaskManager:
         }
 
 
+def _toggled(values: list[int], task_id: int) -> list[int]:
+    """返回在已排序 ID 列表中增加或移除 `task_id` 后的新列表。"""
+    result = [int(v) for v in values]
+    index = bisect.bisect_left(result, task_id)
+    if index < len(result) and result[index] == task_id:
+        del result[index]
+    else:
+        result.insert(index, task_id)
+    return result
+
+
 def _to_json(data: Any) -> str:
-    return json.dumps(data, ensure_ascii=False, indent=2)
+    return _dumps(data).decode("utf-8")
 
 
 def build_task_tools(task_manager: TaskManager) -> list:
@@ -170,13 +170,12 @@ def inject_lead_inbox_messages(history: list[dict[str, str]], bus: MessageBus, l
     if not inbox_messages:
         return 0
 
-    history.append(
-        {
-            "role": "user",
-            "content": f"<team-inbox>\n{_to_json(inbox_messages)}\n</team-inbox>",
-        }
+    history.extend(
+        (
+            {"role": "user", "content": f"<team-inbox>\n{_to_json(inbox_messages)}\n</team-inbox>"},
+            {"role": "assistant", "content": "Noted team inbox messages."},
+        )
     )
-    history.append({"role": "assistant", "content": "Noted team inbox messages."})
     return len(inbox_messages)
 
 
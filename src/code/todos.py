@@ -1,28 +1,122 @@
 """Todo 相关解析与渲染工具。"""
 
 import ast
+import json
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import Any
 
 
+_TODO_MARKER = "Updated todo list to "
+_TODO_MARKER_LEN = len(_TODO_MARKER)
+_PARSED_PAYLOAD_CACHE_SIZE = 128
+
+
 @dataclass
 class TodoRenderState:
     """Todo 渲染状态。
 
     Attributes:
         last_todos: 上一次已渲染的 todo 列表，用于避免重复输出。
+        parsed_payloads: `id(content) -> (content, 解析结果)` 的有界 LRU；同一条消息在流式过程中
+            被重复渲染（如 `refresh_last`）时不再重复解析回显载荷。保留 content 引用以防 id 被复用。
     """
 
     last_todos: list[dict[str, Any]] = field(default_factory=list)
+    parsed_payloads: OrderedDict[int, tuple[str, Any]] = field(default_factory=OrderedDict)
 
 
-def todos_updates_from_messages(messages: list, start_index: int = 0) -> list[tuple[int, list[dict[str, Any]]]]:
-    """从消息列表中提取 todo 更新事件。
+MessageFields = tuple[Any, list | None]
+
+
+def message_fields(message: Any) -> MessageFields:
+    """一次性取出消息的 `content` 与 `tool_calls`。
+
+    兼容 LangChain 消息对象与普通 dict；渲染链路上的各个函数共用该结果，
+    避免对同一条消息重复做 `getattr`/`isinstance` 探测。
+
+    Args:
+        message: Agent 消息。
+
+    Returns:
+        `(content, tool_calls)` 二元组，缺失字段为 `None`。
+    """
+    content = getattr(message, "content", None)
+    tool_calls = getattr(message, "tool_calls", None)
+    if isinstance(message, dict):
+        if content is None:
+            content = message.get("content")
+        if tool_calls is None:
+            tool_calls = message.get("tool_calls")
+    return content, tool_calls
+
+
+def todos_from_fields(
+    content: Any,
+    tool_calls: list | None,
+    parse_cache: OrderedDict[int, tuple[str, Any]] | None = None,
+) -> list[list[dict[str, Any]]]:
+    """从单条消息的字段中提取 todo 更新（按出现顺序）。
 
     支持两类来源：
     1) `write_todos/todowrite` 工具调用参数中的 `todos`；
     2) 文本内容里 `Updated todo list to ...` 的回显。
 
+    Args:
+        content: 消息内容。
+        tool_calls: 消息的工具调用列表。
+        parse_cache: 可选的回显解析缓存（通常为 `TodoRenderState.parsed_payloads`）。
+
+    Returns:
+        该消息携带的 todo 列表；没有更新时为空列表。
+    """
+    updates: list[list[dict[str, Any]]] = []
+    if tool_calls:
+        for call in tool_calls:
+            call_name = (call.get("name") or "").lower()
+            if call_name not in ("write_todos", "todowrite"):
+                continue
+            args = call.get("args", {})
+            if isinstance(args, dict) and isinstance(args.get("todos"), list):
+                updates.append(args["todos"])
+
+    if not isinstance(content, str):
+        return updates
+    pos = content.find(_TODO_MARKER)
+    if pos < 0:
+        return updates
+    if parse_cache is None:
+        parsed = _parse_todos_payload(content[pos + _TODO_MARKER_LEN :].strip())
+    else:
+        parsed = _parse_todos_cached(content, pos, parse_cache)
+    if isinstance(parsed, list):
+        updates.append(parsed)
+    return updates
+
+
+def todos_updates_from_fields(
+    fields: list[MessageFields],
+    parse_cache: OrderedDict[int, tuple[str, Any]] | None = None,
+) -> list[tuple[int, list[dict[str, Any]]]]:
+    """从预先提取的消息字段中提取 todo 更新事件。
+
+    Args:
+        fields: `message_fields` 的结果列表。
+        parse_cache: 可选的回显解析缓存（通常为 `TodoRenderState.parsed_payloads`）。
+
+    Returns:
+        形如 `(message_index, todos)` 的更新事件列表，下标相对于 `fields`。
+    """
+    return [
+        (idx, todos)
+        for idx, (content, tool_calls) in enumerate(fields)
+        for todos in todos_from_fields(content, tool_calls, parse_cache)
+    ]
+
+
+def todos_updates_from_messages(messages: list, start_index: int = 0) -> list[tuple[int, list[dict[str, Any]]]]:
+    """从消息列表中提取 todo 更新事件。
+
     Args:
         messages: Agent 消息列表。
         start_index: 起始扫描下标，仅扫描该下标及之后的消息。
@@ -30,53 +124,58 @@ def todos_updates_from_messages(messages: list, start_index: int = 0) -> list[tu
     Returns:
         形如 `(message_index, todos)` 的更新事件列表。
     """
-    updates: list[tuple[int, list[dict[str, Any]]]] = []
-    for idx, message in enumerate(messages or []):
-        if idx < start_index:
-            continue
+    fields = [message_fields(message) for message in (messages or [])[start_index:]]
+    return [(start_index + idx, todos) for idx, todos in todos_updates_from_fields(fields)]
 
-        tool_calls = getattr(message, "tool_calls", None)
-        if tool_calls is None and isinstance(message, dict):
-            tool_calls = message.get("tool_calls")
-        if tool_calls:
-            for call in tool_calls:
-                call_name = (call.get("name") or "").lower()
-                if call_name not in ("write_todos", "todowrite"):
-                    continue
-                args = call.get("args", {})
-                if isinstance(args, dict) and isinstance(args.get("todos"), list):
-                    updates.append((idx, args["todos"]))
-
-        content = getattr(message, "content", None)
-        if content is None and isinstance(message, dict):
-            content = message.get("content")
-        if not isinstance(content, str):
-            continue
-        marker = "Updated todo list to "
-        if marker in content:
-            raw = content.split(marker, 1)[-1].strip()
-            try:
-                parsed = ast.literal_eval(raw)
-                if isinstance(parsed, list):
-                    updates.append((idx, parsed))
-            except Exception:
-                pass
-    return updates
 
+def _parse_todos_payload(raw: str) -> Any:
+    """解析 todo 回显载荷：优先走 `json.loads`，失败再回退到 `ast.literal_eval`。
 
-def render_todos(todos: list[dict[str, Any]]) -> None:
-    """将 todo 列表格式化打印到终端。
+    JSON 解析比构建完整 AST 快一到两个数量级；Python repr 风格（单引号）的载荷
+    会在第一个非法字符处快速失败，再交给 `literal_eval` 处理。
+
+    Args:
+        raw: `Updated todo list to ` 之后的文本。
+
+    Returns:
+        解析结果；两种方式都失败时返回 `None`。
+    """
+    try:
+        return json.loads(raw)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(raw)
+    except Exception:
+        return None
+
+
+def _parse_todos_cached(content: str, pos: int, cache: OrderedDict[int, tuple[str, Any]]) -> Any:
+    """按 content 对象身份缓存 `_parse_todos_payload` 的结果。"""
+    key = id(content)
+    cached = cache.get(key)
+    if cached is not None and cached[0] is content:
+        cache.move_to_end(key)
+        return cached[1]
+    parsed = _parse_todos_payload(content[pos + _TODO_MARKER_LEN :].strip())
+    cache[key] = (content, parsed)
+    if len(cache) > _PARSED_PAYLOAD_CACHE_SIZE:
+        cache.popitem(last=False)
+    return parsed
+
+
+def format_todos(todos: list[dict[str, Any]]) -> list[str]:
+    """把 todo 列表格式化为终端输出行。
 
     Args:
         todos: todo 字典列表，通常包含 `status/content/activeForm` 字段。
 
     Returns:
-        None。函数直接执行打印副作用。
+        待输出的文本行（不含行尾换行）。
     """
     if not todos:
-        print("\nTodos: (empty)")
-        return
-    print("\nTodos:")
+        return ["\nTodos: (empty)"]
+    lines = ["\nTodos:"]
     for item in todos:
         status = item.get("status", "unknown")
         content = item.get("content", "")
@@ -84,4 +183,17 @@ def render_todos(todos: list[dict[str, Any]]) -> None:
         row = f"- [{status}] {content}"
         if active_form and status == "in_progress":
             row += f" <- {active_form}"
-        print(row)
+        lines.append(row)
+    return lines
+
+
+def render_todos(todos: list[dict[str, Any]]) -> None:
+    """将 todo 列表格式化打印到终端。
+
+    Args:
+        todos: todo 字典列表，通常包含 `status/content/activeForm` 字段。
+
+    Returns:
+        None。函数直接执行打印副作用。
+    """
+    print("\n".join(format_todos(todos)))
@@ -1,13 +1,33 @@
 import os
-from typing import Literal
+import threading
+from typing import Any, Literal
 
-try:
-    from tavily import TavilyClient
-except Exception:
-    TavilyClient = None
+# 首次调用时才导入 tavily 并创建客户端，之后复用；锁只保护这一次性的构造。
+_client: Any = None
+_client_error: str | None = None
+_client_ready = False
+_client_lock = threading.Lock()
+
+
+def _get_client() -> tuple[Any, str | None]:
+    global _client, _client_error, _client_ready
+    if _client_ready:
+        return _client, _client_error
+    with _client_lock:
+        if not _client_ready:
+            try:
+                from tavily import TavilyClient
+            except Exception:
+                _client_error = "Error: tavily package is not installed. Please install tavily-python."
+            else:
+                api_key = os.getenv("TAVILY_API_KEY")
+                if api_key:
+                    _client = TavilyClient(api_key=api_key)
+                else:
+                    _client_error = "Error: TAVILY_API_KEY is not set"
+            _client_ready = True
+    return _client, _client_error
 
-tavily_api_key = os.getenv("TAVILY_API_KEY")
-tavily_client = TavilyClient(api_key=tavily_api_key) if (TavilyClient and tavily_api_key) else None
 
 def internet_search(
     query: str,
@@ -16,11 +36,10 @@ def internet_search(
     include_raw_content: bool = False,
 ):
     """Run a web search"""
-    if TavilyClient is None:
-        return "Error: tavily package is not installed. Please install tavily-python."
-    if tavily_client is None:
-        return "Error: TAVILY_API_KEY is not set"
-    return tavily_client.search(
+    client, error = _get_client()
+    if client is None:
+        return error
+    return client.search(
         query,
         max_results=max_results,
         include_raw_content=include_raw_content,
@@ -0,0 +1,38 @@
+import json
+import time
+
+from src.code.background_tasks import BackgroundManager
+
+
+def _wait_for_completion(manager, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        notifications = manager.drain_notifications()
+        if notifications:
+            return notifications
+        time.sleep(0.02)
+    raise AssertionError("background task did not finish in time")
+
+
+def test_task_dict_reflects_status_change_after_completion(tmp_path):
+    manager = BackgroundManager(tmp_path)
+    task_id = json.loads(manager.run("sleep 0.2; echo done"))["task_id"]
+
+    before = json.loads(manager.check(task_id))
+    assert before["status"] == "running"
+    assert before["finished_at"] is None
+    assert before["output_preview"] == ""
+
+    notifications = _wait_for_completion(manager)
+    assert notifications[0]["task_id"] == task_id
+
+    after = json.loads(manager.check(task_id))
+    assert after["status"] == "completed"
+    assert after["return_code"] == 0
+    assert after["finished_at"] is not None
+    assert after["output_preview"] == "done"
+
+    summary = json.loads(manager.check())
+    assert summary["completed"] == 1
+    assert summary["running"] == 0
+    assert summary["tasks"] == [after]
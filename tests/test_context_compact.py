@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from src.code import context_compact
+from src.code.context_compact import _serialize_until
+
+RECORDS = [
+    {"role": "user", "content": "修复 bug", "n": 1},
+    {"role": "assistant", "content": [{"type": "text", "text": "ok"}], "ratio": 0.5, "flag": None},
+    {"role": "tool", "content": "x" * 50},
+]
+
+
+def _expected(budget):
+    return json.dumps(RECORDS, ensure_ascii=False, default=str, separators=(",", ":"))[:budget]
+
+
+@pytest.mark.parametrize("budget", [1, 10, 40, 85, 10_000])
+def test_serialize_until_matches_compact_dumps_without_orjson(monkeypatch, budget):
+    monkeypatch.setattr(context_compact, "orjson", None)
+
+    assert _serialize_until(RECORDS, budget) == _expected(budget)
+
+
+@pytest.mark.parametrize("budget", [1, 10, 40, 85, 10_000])
+def test_serialize_until_matches_compact_dumps_with_orjson(monkeypatch, budget):
+    monkeypatch.setattr(context_compact, "orjson", pytest.importorskip("orjson"))
+
+    assert _serialize_until(RECORDS, budget) == _expected(budget)
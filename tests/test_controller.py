@@ -0,0 +1,50 @@
+from src.code.controller import BatchQueue, parse_batched_results, parse_selection_command, render_batch_results
+
+
+def _parse(user_input, batch):
+    return parse_selection_command(
+        user_input,
+        None,
+        None,
+        handle_skill_command=None,
+        handle_subagent_command=None,
+        skills={},
+        skill_aliases={},
+        subagent_by_name={},
+        batch_queue=batch,
+    )
+
+
+def test_batch_run_moves_pending_to_dispatched():
+    batch = BatchQueue()
+    _parse("/batch fix the typo", batch)
+    _parse("/batch add a test", batch)
+
+    _, _, task_text, handled = _parse("/batch run", batch)
+
+    assert handled is False
+    assert "1. fix the typo" in task_text and "2. add a test" in task_text
+    assert batch.pending == []
+    assert batch.dispatched == ["fix the typo", "add a test"]
+
+
+def test_parse_batched_results_maps_ids_to_tasks():
+    reply = 'Done.\n```json\n[{"id": 2, "result": "added"}, {"id": 1, "result": {"files": 1}}]\n```'
+
+    assert parse_batched_results(["fix", "test"], reply) == [("fix", {"files": 1}), ("test", "added")]
+    assert render_batch_results(["fix", "test"], [{"type": "text", "text": reply}]).splitlines() == [
+        "[batch] results:",
+        '  1. fix -> {"files": 1}',
+        "  2. test -> added",
+    ]
+
+
+def test_parse_batched_results_rejects_malformed_replies():
+    tasks = ["a", "b"]
+
+    assert parse_batched_results(tasks, "no list here") is None
+    assert parse_batched_results(tasks, "[not json]") is None
+    assert parse_batched_results(tasks, '[{"id": 1, "result": "x"}]') is None
+    assert parse_batched_results(tasks, '[{"id": 1, "result": "x"}, {"id": 1, "result": "y"}]') is None
+    assert parse_batched_results(tasks, '[{"id": 1}, {"id": 2, "result": "y"}]') is None
+    assert render_batch_results(tasks, "oops").startswith("[batch] reply is not a JSON list")
@@ -0,0 +1,71 @@
+import copy
+import json
+
+import pytest
+
+from src.code import stream_runtime
+from src.code.stream_runtime import TurnPrinter, network_errors, stream_with_retry
+from src.code.todos import TodoRenderState
+
+
+class _FailingAgent:
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+        self.calls = 0
+
+    def stream(self, state, config, stream_mode):
+        self.calls += 1
+        raise self.exc
+        yield  # pragma: no cover
+
+
+def test_api_connection_error_is_network_error_and_keeps_history(monkeypatch):
+    anthropic = pytest.importorskip("anthropic")
+    httpx = pytest.importorskip("httpx")
+    monkeypatch.setattr(stream_runtime, "_backoff_delay", lambda attempt: 0)
+
+    history = [{"role": "user", "content": "run the tests"}]
+    before = copy.deepcopy(history)
+    agent = _FailingAgent(anthropic.APIConnectionError(request=httpx.Request("POST", "https://example.invalid")))
+
+    with pytest.raises(network_errors()):
+        stream_with_retry(agent, history, 10, TurnPrinter(TodoRenderState(), {}))
+
+    assert history == before
+    assert agent.calls == stream_runtime._MAX_STREAM_ATTEMPTS
+
+
+class _ProgressThenFailAgent:
+    def __init__(self, history, fail_after_progress: bool) -> None:
+        self.history = history
+        self.fail_after_progress = fail_after_progress
+        self.calls = 0
+
+    def stream(self, state, config, stream_mode):
+        self.calls += 1
+        yield {"messages": list(self.history)}
+        if self.fail_after_progress:
+            yield {"messages": [*self.history, {"role": "assistant", "content": "", "tool_calls": []}]}
+        raise json.JSONDecodeError("Expecting value", "", 0)
+
+
+def test_retries_while_no_new_message_was_streamed(monkeypatch):
+    monkeypatch.setattr(stream_runtime, "_backoff_delay", lambda attempt: 0)
+    history = [{"role": "user", "content": "hi"}]
+    agent = _ProgressThenFailAgent(history, fail_after_progress=False)
+
+    with pytest.raises(json.JSONDecodeError):
+        stream_with_retry(agent, history, 10, TurnPrinter(TodoRenderState(), {}))
+
+    assert agent.calls == stream_runtime._MAX_STREAM_ATTEMPTS
+
+
+def test_does_not_retry_after_the_turn_made_progress(monkeypatch):
+    monkeypatch.setattr(stream_runtime, "_backoff_delay", lambda attempt: 0)
+    history = [{"role": "user", "content": "hi"}]
+    agent = _ProgressThenFailAgent(history, fail_after_progress=True)
+
+    with pytest.raises(json.JSONDecodeError):
+        stream_with_retry(agent, history, 10, TurnPrinter(TodoRenderState(), {}))
+
+    assert agent.calls == 1